@@ -1,17 +1,35 @@
 import os
 import json
+import base64
+import hashlib
+import mimetypes
 import subprocess
-import shutil
+import time
+import sqlite3
+import tempfile
+import uuid
+from contextlib import closing
 from urllib.parse import urlparse
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta, date
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from datetime import datetime, timedelta, date, timezone
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, abort, stream_with_context, g
 from functools import wraps
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from sqlalchemy import func
-from models import db, Teacher, Resource, ScheduleTemplate, Booking
-from flask_migrate import Migrate
+from itsdangerous import URLSafeSerializer, BadSignature
+from werkzeug.http import is_resource_modified
+from sqlalchemy import func, select, tuple_, case, or_, and_
+from models import db, School, Teacher, TeacherSearchTerm, Resource, ScheduleTemplate, Booking, BookingChange, BookingChangeCompaction, OccupancyVersion, BackgroundTask, normalize_search_text, record_bulk_booking_deletes, record_booking_reset
+import assets
+import backup_store
+import read_replica
+import tenancy
+from read_replica import read_only
+import click
+from flask_migrate import Migrate, upgrade as migrate_upgrade, stamp as migrate_stamp
+from alembic.migration import MigrationContext
 from celery import Celery 
+from celery.schedules import crontab
+from kombu.exceptions import OperationalError
 from logging import getLogger
 
 # --- CONFIGURAÇÃO DA APLICAÇÃO ---
@@ -29,12 +47,61 @@ if database_uri.startswith("postgres://"):
 app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# --- RÉPLICA DE LEITURA OPCIONAL (relatórios e agenda semanal) ---
+read_database_uri = os.environ.get('DATABASE_READ_URL')
+if read_database_uri:
+    if read_database_uri.startswith("postgres://"):
+        read_database_uri = read_database_uri.replace("postgres://", "postgresql://", 1)
+    app.config['SQLALCHEMY_BINDS'] = {read_replica.REPLICA_BIND: {'url': read_database_uri, 'pool_pre_ping': True}}
+app.config['READ_YOUR_WRITES_SECONDS'] = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+app.config['REPLICA_MAX_LAG_SECONDS'] = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+app.config['REPLICA_CHECK_INTERVAL'] = 5 # Segundos entre verificações de atraso da réplica
+app.config['REPLICA_RETRY_AFTER'] = 30 # Segundos até tentar de novo uma réplica com problema
+
+# --- VÁRIAS ESCOLAS (tenancy.py) ---
+# Escola usada quando o caminho (/s/<slug>/) e o hostname não indicam nenhuma
+app.config['DEFAULT_SCHOOL_SLUG'] = os.environ.get('DEFAULT_SCHOOL_SLUG', 'default')
+app.config['SCHOOL_CACHE_SECONDS'] = 60 # Tempo que o cadastro de escolas fica em cache por processo
+
 # --- NOVA CONFIGURAÇÃO DA PASTA DE BACKUP ---
 BACKUP_FOLDER = os.path.join(DATA_DIR, 'backups')
 os.makedirs(BACKUP_FOLDER, exist_ok=True) # Garante que a pasta exista
+# Backups automáticos no repositório deduplicado (backup_store.py) de cada escola
+app.config['BACKUP_HOUR'] = int(os.environ.get('BACKUP_HOUR', 3)) # Hora do backup diário
+app.config['BACKUP_KEEP_DAILY'] = int(os.environ.get('BACKUP_KEEP_DAILY', 7))
+app.config['BACKUP_KEEP_WEEKLY'] = int(os.environ.get('BACKUP_KEEP_WEEKLY', 4))
+app.config['BACKUP_KEEP_MONTHLY'] = int(os.environ.get('BACKUP_KEEP_MONTHLY', 12))
+SHARED_BACKUP_STORE = '_principal' # Repositório do banco principal quando ele tem dados de várias escolas
+
+# --- CONFIGURAÇÃO DOS ARQUIVOS ESTÁTICOS COMPILADOS (flask build-assets) ---
+# No Docker fica fora de /app para não ser escondido pelo volume do código
+app.config['ASSETS_DIST_DIR'] = os.environ.get('ASSETS_DIST_DIR', os.path.join(app.static_folder, 'dist'))
+ASSETS_MAX_AGE = 365 * 24 * 60 * 60 # Nomes com hash de conteúdo podem ficar em cache por um ano
 
 app.config['CELERY_BROKER_URL'] = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 app.config['CELERY_RESULT_BACKEND'] = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+app.config['CELERY_TIMEZONE'] = os.environ.get('TZ', 'UTC') # Horários do crontab abaixo
+# Com o Redis fora do ar, agendar uma tarefa falha em até ~2 s em vez de prender a requisição
+# por ~20 s tentando reconectar (as rotas avisam e seguem; ver enqueue_task)
+app.config['BROKER_CONNECTION_TIMEOUT'] = 2
+app.config['CELERY_REDIS_SOCKET_CONNECT_TIMEOUT'] = 2
+app.config['CELERY_TASK_PUBLISH_RETRY_POLICY'] = {'max_retries': 1, 'interval_start': 0, 'interval_step': 0.2, 'interval_max': 0.2}
+app.config['CELERY_RESULT_BACKEND_TRANSPORT_OPTIONS'] = {'retry_policy': {'max_retries': 1}}
+# Tarefas periódicas (executadas pelo serviço 'beat' do docker-compose)
+app.config['CELERYBEAT_SCHEDULE'] = {
+    'compact-booking-changes': {
+        'task': 'app.compact_booking_changes_task',
+        'schedule': timedelta(hours=6),
+    },
+    'backup-databases': {
+        'task': 'app.scheduled_backup_task',
+        'schedule': crontab(hour=app.config['BACKUP_HOUR'], minute=0),
+    },
+    'verify-backups': {
+        'task': 'app.verify_backups_task',
+        'schedule': crontab(hour=app.config['BACKUP_HOUR'], minute=30, day_of_week='sunday'),
+    },
+}
 
 def make_celery(app):
     celery = Celery(
@@ -52,8 +119,28 @@ def make_celery(app):
 
 celery = make_celery(app)
 
+# --- LOG DE ALTERAÇÕES DE AGENDAMENTOS ---
+BOOKING_CHANGE_RETENTION_DAYS = 7 # Clientes parados há mais tempo recebem 'reset' e recarregam tudo
+BOOKING_CHANGE_PAGE_SIZE = 500
+
+# --- CONFIGURAÇÃO DO FEED iCALENDAR ---
+# O token do feed é [escola, professor] assinado com a SECRET_KEY (não expõe a matrícula)
+calendar_serializer = URLSafeSerializer(app.config['SECRET_KEY'], salt='calendar-feed')
+CALENDAR_FEED_PAST_DAYS = 30 # Dias passados mantidos no feed
+CALENDAR_FEED_MAX_AGE = 300 # Segundos que o cliente pode reutilizar o feed sem revalidar
+MY_BOOKINGS_PAGE_SIZE = 20
+AVAILABILITY_DEFAULT_DAYS = 7
+AVAILABILITY_MAX_DAYS = 31
+OCCUPANCY_CACHE_SECONDS = 30 # Resumo de ocupação da tela inicial; as gravações pelo app o invalidam na hora (OccupancyVersion)
+PURGE_CHUNK_SIZE = 500 # Agendamentos apagados por transação nas remoções em segundo plano
+# A matrícula de um usuário oculto só fica livre quando a remoção em segundo plano termina
+REGISTRATION_BEING_PURGED = 'A matrícula pertence a um usuário que ainda está sendo removido. Tente novamente em alguns minutos.'
+TEACHER_SEARCH_LIMIT = 10
+
 # --- INICIALIZAÇÃO DAS EXTENSÕES ---
 db.init_app(app)
+read_replica.init_app(app)
+tenancy.init_app(app)
 migrate = Migrate(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -62,34 +149,48 @@ login_manager.login_message = "Você precisa fazer login para acessar esta pági
 login_manager.login_message_category = "warning"
 
 @celery.task
-def restore_task_bg(filepath, db_uri_str):
-    """Executa o pg_restore em segundo plano."""
+def restore_task_bg(school_id, filepath, db_uri_str):
+    """Executa o pg_restore em segundo plano no banco da escola."""
+    with tenancy.school_context(school_id):
+        restore_database_file(filepath, db_uri_str)
+
+def restore_database_file(filepath, db_uri_str):
     log = getLogger(__name__)
     log.info(f"Iniciando restauração do arquivo: {filepath}")
     try:
-        # Extrai os detalhes da conexão da URI
-        parsed_uri = urlparse(db_uri_str)
-        db_name, user, password, host, port = parsed_uri.path.lstrip('/'), parsed_uri.username, parsed_uri.password, parsed_uri.hostname, parsed_uri.port
-        
-        env = os.environ.copy()
-        env['PGPASSWORD'] = password
+        if db_uri_str.startswith('sqlite'):
+            # A API de backup do SQLite substitui o conteúdo página a página, com o banco em uso
+            with closing(sqlite3.connect(filepath)) as source, closing(sqlite3.connect(db_uri_str.split('///')[1])) as target:
+                source.backup(target)
+        else:
+            # Extrai os detalhes da conexão da URI
+            parsed_uri = urlparse(db_uri_str)
+            db_name, user, password, host, port = parsed_uri.path.lstrip('/'), parsed_uri.username, parsed_uri.password, parsed_uri.hostname, parsed_uri.port
 
-        command = [
-            'pg_restore',
-            '--host', host,
-            '--port', str(port),
-            '--username', user,
-            '--dbname', db_name,
-            '--no-password',
-            '--clean',
-            '--if-exists',
-            filepath
-        ]
-        
-        # Executa o comando sem capturar a saída para evitar deadlocks
-        subprocess.run(command, check=True, env=env, stdin=subprocess.DEVNULL)
+            env = os.environ.copy()
+            env['PGPASSWORD'] = password
+
+            command = [
+                'pg_restore',
+                '--host', host,
+                '--port', str(port),
+                '--username', user,
+                '--dbname', db_name,
+                '--no-password',
+                '--clean',
+                '--if-exists',
+                filepath
+            ]
+
+            # Executa o comando sem capturar a saída para evitar deadlocks
+            subprocess.run(command, check=True, env=env, stdin=subprocess.DEVNULL)
         log.info(f"Restauração do arquivo {filepath} concluída com sucesso!")
 
+        # Todo o estado mudou: os clientes do /api/changes precisam recarregar tudo
+        record_booking_reset(db.session.connection(), g.school_id)
+        invalidate_occupancy()
+        db.session.commit()
+
     except Exception as e:
         log.error(f"Falha na restauração do backup: {str(e)}")
     finally:
@@ -98,9 +199,158 @@ def restore_task_bg(filepath, db_uri_str):
             os.remove(filepath)
             log.info(f"Arquivo de backup temporário {filepath} removido.")
 
+@celery.task
+def restore_snapshot_task(school_id, snapshot_id):
+    """Remonta um snapshot do repositório de backups e o restaura no banco da escola."""
+    with tenancy.school_context(school_id):
+        store = school_backup_store()
+        try:
+            manifest = store.load(snapshot_id)
+            filepath = os.path.join(school_backup_folder(), f"restore_{snapshot_id}_{manifest['filename']}")
+            store.export(snapshot_id, filepath)
+        except backup_store.BackupError as e:
+            getLogger(__name__).error(f"Falha ao remontar o snapshot {snapshot_id}: {e}")
+            return
+        restore_database_file(filepath, school_database_uri())
+
+@celery.task
+def manual_backup_task(school_id):
+    """Snapshot pedido na página de backups; o id do snapshot fica no resultado da tarefa."""
+    with tenancy.school_context(school_id):
+        manifest = snapshot_database(school_backup_store(), school_database_uri(), 'manual')
+    getLogger(__name__).info(f"Escola {school_id}: backup manual {manifest['id']} com {manifest['size']} bytes.")
+    return {'snapshot_id': manifest['id']}
+
+@celery.task
+def verify_backup_task(school_id, snapshot_id):
+    """Verificação pedida na página de backups; o resultado fica no manifesto e no da tarefa."""
+    with tenancy.school_context(school_id):
+        ok, error = school_backup_store().verify(snapshot_id)
+    if not ok:
+        getLogger(__name__).error(f"Escola {school_id}: snapshot {snapshot_id} com problema: {error}")
+    return {'snapshot_id': snapshot_id, 'verified': ok, 'error': error}
+
+@celery.task
+def scheduled_backup_task():
+    """Backup diário de cada banco no repositório deduplicado, seguido da retenção GFS."""
+    log = getLogger(__name__)
+    for store, db_uri in iter_backup_stores():
+        try:
+            manifest = snapshot_database(store, db_uri, 'scheduled')
+            removed, removed_chunks = prune_backups(store)
+            log.info(f"Backup {manifest['id']} em {store.path}: {manifest['size']} bytes, {manifest['stored_bytes']} novos; "
+                     f"retenção removeu {removed} snapshots e {removed_chunks} blocos.")
+        except Exception as e:
+            # A falha de um banco não impede o backup dos outros
+            log.error(f"Falha no backup em {store.path}: {e}")
+
+@celery.task
+def verify_backups_task():
+    """Confere todos os blocos de todos os snapshots (o resultado aparece na página de backups)."""
+    log = getLogger(__name__)
+    for store, _ in iter_backup_stores():
+        for snapshot in store.snapshots():
+            ok, error = store.verify(snapshot['id'])
+            if not ok:
+                log.error(f"Snapshot {snapshot['id']} em {store.path} com problema: {error}")
+
+def purge_bookings_in_chunks(task, condition):
+    """Apaga os agendamentos que atendem à condição em lotes, com uma transação curta por lote."""
+    total = Booking.query.filter(condition).count()
+    deleted = 0
+    while True:
+        ids = [booking_id for (booking_id,) in db.session.query(Booking.id).filter(condition).limit(PURGE_CHUNK_SIZE)]
+        if not ids:
+            break
+        # O DELETE em lote não dispara os eventos do ORM, então o log é gravado aqui
+        record_bulk_booking_deletes(db.session.connection(), g.school_id, ids)
+        Booking.query.filter(Booking.id.in_(ids)).delete(synchronize_session=False)
+        invalidate_occupancy()
+        db.session.commit()
+        deleted += len(ids)
+        if not task.request.is_eager: # Via `flask purge-deleted` não há backend de resultados
+            task.update_state(state='PROGRESS', meta={'deleted': deleted, 'total': total})
+    return deleted
+
+@celery.task(bind=True)
+def purge_resource_task(self, school_id, resource_id):
+    """Remove em segundo plano um recurso já ocultado, começando pelos seus agendamentos."""
+    log = getLogger(__name__)
+    with tenancy.school_context(school_id):
+        deleted = purge_bookings_in_chunks(self, Booking.resource_id == resource_id)
+        resource = db.session.get(Resource, resource_id)
+        if resource:
+            # Os templates de horário são removidos pelo cascade do relacionamento
+            db.session.delete(resource)
+        db.session.commit()
+    log.info(f"Escola {school_id}: recurso {resource_id} removido com {deleted} agendamentos.")
+    return {'deleted': deleted, 'total': deleted}
+
+@celery.task(bind=True)
+def purge_teacher_task(self, school_id, teacher_id):
+    """Remove em segundo plano um professor já ocultado, começando pelos seus agendamentos."""
+    log = getLogger(__name__)
+    with tenancy.school_context(school_id):
+        deleted = purge_bookings_in_chunks(self, Booking.teacher_id == teacher_id)
+        teacher = db.session.get(Teacher, teacher_id)
+        if teacher:
+            db.session.delete(teacher)
+        db.session.commit()
+    log.info(f"Escola {school_id}: professor {teacher_id} removido com {deleted} agendamentos.")
+    return {'deleted': deleted, 'total': deleted}
+
+@celery.task
+def compact_booking_changes_task():
+    """Apaga as entradas antigas do log de alterações de cada escola."""
+    log = getLogger(__name__)
+    deleted = 0
+    for school_id in tenancy.all_school_ids():
+        with tenancy.school_context(school_id):
+            deleted += compact_booking_changes()
+    log.info(f"Compactação do log de alterações: {deleted} entradas removidas.")
+    return deleted
+
+def compact_booking_changes():
+    """Compacta o log da escola ativa, sempre preservando a entrada mais recente dela."""
+    cutoff = datetime.utcnow() - timedelta(days=BOOKING_CHANGE_RETENTION_DAYS)
+    latest_seq = db.session.query(func.max(BookingChange.seq)).scalar()
+    if latest_seq is None:
+        return 0
+    deleted = 0
+    while True:
+        seqs = [seq for (seq,) in db.session.query(BookingChange.seq)
+                .filter(BookingChange.changed_at < cutoff, BookingChange.seq < latest_seq)
+                .order_by(BookingChange.seq).limit(PURGE_CHUNK_SIZE)]
+        if not seqs:
+            break
+        BookingChange.query.filter(BookingChange.seq.in_(seqs)).delete(synchronize_session=False)
+        # Registrado na mesma transação: clientes com 'since' anterior a este ponto recebem 'reset'
+        compaction = BookingChangeCompaction.query.first()
+        if compaction is None:
+            db.session.add(BookingChangeCompaction(last_seq=seqs[-1]))
+        else:
+            compaction.last_seq = max(compaction.last_seq, seqs[-1])
+        db.session.commit()
+        deleted += len(seqs)
+    return deleted
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Teacher.query.get(int(user_id))
+    # O id da sessão é "<escola>:<professor>" (Teacher.get_id); a sessão de outra escola não vale aqui
+    school_id, _, teacher_id = user_id.partition(':')
+    if not teacher_id or int(school_id) != tenancy.current_school_id():
+        return None
+    return Teacher.active().filter_by(id=int(teacher_id)).first()
+
+@app.context_processor
+def inject_asset_helpers():
+    """Disponibiliza asset_url() nos templates; sem build, os templates usam os CDNs."""
+    manifest = assets.load_manifest(app.config['ASSETS_DIST_DIR'])
+
+    def asset_url(name):
+        return url_for('serve_asset', filename=manifest.get(name, name))
+
+    return {'asset_url': asset_url, 'assets_built': bool(manifest)}
 
 # --- DECORATOR PARA PROTEGER ROTAS DE ADMINISTRAÇÃO ---
 def admin_required(f):
@@ -112,8 +362,431 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- FUNÇÕES AUXILIARES DE AGENDAMENTOS ---
+def touch_teacher_bookings(teacher_ids):
+    """Marca que os agendamentos dos professores mudaram (invalida o ETag do feed .ics).
+
+    Aceita uma lista de ids ou um select que retorne ids. Não faz commit.
+    """
+    Teacher.query.filter(Teacher.id.in_(teacher_ids)).update(
+        {Teacher.bookings_changed_at: datetime.utcnow()}, synchronize_session=False)
+
+# Resumo de ocupação da tela inicial em cache por processo: {escola: (expira_em, (dia, versão), resumo)}
+_occupancy_cache = {}
+
+def invalidate_occupancy():
+    """Troca a versão do resumo de ocupação da escola ativa. Não faz commit.
+
+    Chamado antes do commit de quem grava agendamentos, grades ou recursos: quando a gravação
+    é confirmada, o resumo em cache deixa de valer em todos os processos (workers e Celery).
+    """
+    token = uuid.uuid4().hex
+    if not OccupancyVersion.query.update({OccupancyVersion.token: token}, synchronize_session=False):
+        db.session.add(OccupancyVersion(token=token))
+
+def occupancy_version():
+    return db.session.scalar(select(OccupancyVersion.token).order_by(OccupancyVersion.id.desc()).limit(1))
+
+# Falhas ao publicar: do broker (kombu) ou do backend de resultados, que o Redis desiste de reconectar
+TASK_QUEUE_ERRORS = (OperationalError, RuntimeError)
+
+def enqueue_task(task, *args):
+    """Agenda a tarefa para a escola ativa e registra o id, que só ela pode consultar em /admin/tasks/<id>.
+
+    Chamar depois do commit das alterações da requisição. Com a fila fora do ar levanta TASK_QUEUE_ERRORS.
+    """
+    task_id = task.delay(g.school_id, *args).id
+    db.session.add(BackgroundTask(task_id=task_id, name=task.name))
+    db.session.commit()
+    return task_id
+
+def enqueue_purge(task, entity_id):
+    """Agenda a remoção em lotes e retorna o id da tarefa (acompanhado em /admin/tasks/<id>).
+
+    Se a fila estiver fora do ar retorna None; `flask purge-deleted` conclui depois.
+    """
+    try:
+        return enqueue_task(task, entity_id)
+    except TASK_QUEUE_ERRORS as e:
+        getLogger(__name__).error(f"Falha ao agendar {task.name}({g.school_id}, {entity_id}): {e}")
+        return None
+
+def encode_booking_cursor(booking):
+    """Gera o cursor opaco (date, shift, id) usado na paginação por chave."""
+    raw = f'{booking.date.isoformat()}|{booking.shift}|{booking.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_booking_cursor(cursor):
+    """Converte o cursor de volta em (date, shift, id). Lança ValueError se for inválido."""
+    # Erros de base64, UTF-8, desempacotamento e conversão são todos subclasses de ValueError
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    date_str, rest = raw.split('|', 1)
+    shift, booking_id = rest.rsplit('|', 1)
+    return datetime.strptime(date_str, '%Y-%m-%d').date(), shift, int(booking_id)
+
+def my_bookings_statement(teacher_id, after=None, limit=MY_BOOKINGS_PAGE_SIZE):
+    """(Booking, Resource) dos agendamentos futuros do professor, com uma linha a mais que o limite."""
+    statement = select(Booking, Resource)\
+        .join(Resource, Booking.resource_id == Resource.id)\
+        .where(Booking.teacher_id == teacher_id, Booking.date >= date.today())\
+        .where(Resource.deleted_at.is_(None))
+    if after:
+        statement = statement.where(tuple_(Booking.date, Booking.shift, Booking.id) > tuple_(*after))
+    return statement.order_by(Booking.date, Booking.shift, Booking.id).limit(limit + 1)
+
+def paginate_my_bookings(rows, limit):
+    next_cursor = encode_booking_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def query_my_bookings(teacher_id, after=None, limit=MY_BOOKINGS_PAGE_SIZE):
+    """Retorna uma página de agendamentos futuros do professor e o cursor da próxima página."""
+    rows = db.session.execute(my_bookings_statement(teacher_id, after, limit)).all()
+    return paginate_my_bookings(rows, limit)
+
+def serialize_my_booking(booking, resource):
+    return {
+        'id': booking.id,
+        'resource_id': resource.id,
+        'resource_name': resource.name,
+        'date': booking.date.strftime('%Y-%m-%d'),
+        'shift': booking.shift,
+        'slot_name': booking.slot_name,
+        'status': booking.status
+    }
+
+def agenda_templates_statement(resource_id):
+    return select(ScheduleTemplate).join(Resource)\
+        .where(ScheduleTemplate.resource_id == resource_id, Resource.deleted_at.is_(None))
+
+def agenda_bookings_statement(resource_id, booking_date):
+    return select(Booking).where(Booking.resource_id == resource_id, Booking.date == booking_date)
+
+def latest_change_seq_statement():
+    return select(func.max(BookingChange.seq))
+
+def build_agenda_data(templates, bookings, viewer):
+    """Monta {turno: [horários]} da agenda de um dia a partir da grade e dos agendamentos."""
+    booked_slots = { (b.shift, b.slot_name): b for b in bookings }
+    
+    agenda_data = {}
+    for template in templates:
+        shift_slots = []
+        
+        if not isinstance(template.slots, list):
+            continue 
+
+        for slot in template.slots:
+            if not isinstance(slot, dict) or 'name' not in slot or 'type' not in slot:
+                continue
+
+            booking = booked_slots.get((template.shift, slot['name']))
+            shift_slots.append(serialize_slot(slot, booking, viewer))
+        agenda_data[template.shift] = shift_slots
+    return agenda_data
+
+def availability_statement(resource_id, start, end):
+    """Quantidade de agendamentos por (data, turno, status) do recurso no período."""
+    return select(Booking.date, Booking.shift, Booking.status, func.count(Booking.id))\
+        .where(Booking.resource_id == resource_id, Booking.date.between(start, end))\
+        .group_by(Booking.date, Booking.shift, Booking.status)
+
+def bookable_slot_count(template):
+    """Horários agendáveis (exceto intervalos) de uma grade."""
+    if not isinstance(template.slots, list):
+        return 0
+    return sum(1 for slot in template.slots if isinstance(slot, dict) and 'name' in slot and slot.get('type') != 'intervalo')
+
+def build_availability(templates, counts, start, days):
+    """Resumo livre/agendado/fechado por dia útil e turno."""
+    totals = {template.shift: bookable_slot_count(template) for template in templates}
+    used = {}
+    for booking_date, shift, status, count in counts:
+        used[(booking_date, shift, status)] = count
+
+    result = []
+    for offset in range(days):
+        current = start + timedelta(days=offset)
+        if current.weekday() >= 5:
+            continue
+        shifts = {}
+        for shift, total in totals.items():
+            booked = used.get((current, shift, 'booked'), 0)
+            closed = used.get((current, shift, 'closed'), 0)
+            shifts[shift] = {'total': total, 'booked': booked, 'closed': closed, 'free': max(total - booked - closed, 0)}
+        result.append({'date': current.strftime('%Y-%m-%d'), 'shifts': shifts})
+    return result
+
+def occupancy_statement(start, end):
+    """Grades de todos os recursos ativos com a contagem de agendamentos por (data, status) do turno.
+
+    Uma única consulta para a tela inicial, com quantos recursos houver.
+    """
+    counts = select(Booking.resource_id, Booking.shift, Booking.date, Booking.status, func.count(Booking.id).label('count'))\
+        .where(Booking.date.between(start, end))\
+        .group_by(Booking.resource_id, Booking.shift, Booking.date, Booking.status)\
+        .subquery()
+    return select(ScheduleTemplate, counts.c.date, counts.c.status, counts.c.count)\
+        .select_from(ScheduleTemplate)\
+        .join(Resource, ScheduleTemplate.resource_id == Resource.id).where(Resource.deleted_at.is_(None))\
+        .outerjoin(counts, and_(counts.c.resource_id == ScheduleTemplate.resource_id, counts.c.shift == ScheduleTemplate.shift))
+
+def build_occupancy(rows, day):
+    """{recurso: {'today': {turno: contagens}, 'week': {turno: contagens}}} do dia e dos dias úteis até sexta."""
+    days = 5 - day.weekday()
+    templates, counts = {}, {}
+    for template, booking_date, status, count in rows:
+        templates.setdefault(template.resource_id, {})[template.shift] = template
+        if booking_date is not None:
+            counts.setdefault(template.resource_id, []).append((booking_date, template.shift, status, count))
+
+    summary = {}
+    for resource_id, shifts in templates.items():
+        availability = build_availability(shifts.values(), counts.get(resource_id, []), day, days)
+        week = {}
+        for entry in availability:
+            for shift, shift_counts in entry['shifts'].items():
+                totals = week.setdefault(shift, dict.fromkeys(shift_counts, 0))
+                for key, value in shift_counts.items():
+                    totals[key] += value
+        summary[resource_id] = {'today': availability[0]['shifts'], 'week': week}
+    return summary
+
+def occupancy_summary():
+    """Resumo de ocupação da escola ativa, do próximo dia útil (hoje, de segunda a sexta) até sexta."""
+    day = date.today()
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    key = (day, occupancy_version())
+    cached = _occupancy_cache.get(g.school_id)
+    if cached and cached[0] > time.monotonic() and cached[1] == key:
+        return day, cached[2]
+
+    rows = db.session.execute(occupancy_statement(day, day + timedelta(days=4 - day.weekday()))).all()
+    summary = build_occupancy(rows, day)
+    _occupancy_cache[g.school_id] = (time.monotonic() + OCCUPANCY_CACHE_SECONDS, key, summary)
+    return day, summary
+
+def parse_availability_range(args):
+    """Lê start (padrão: hoje) e days (1 a AVAILABILITY_MAX_DAYS). Lança ValueError se inválidos."""
+    start = datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start') else date.today()
+    days = int(args.get('days', AVAILABILITY_DEFAULT_DAYS))
+    if not 1 <= days <= AVAILABILITY_MAX_DAYS:
+        raise ValueError('days fora do intervalo')
+    return start, days
+
+def ics_escape(text):
+    """Escapa um valor de texto conforme a RFC 5545."""
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def ics_line(line):
+    """Dobra a linha em blocos de até 75 octetos (RFC 5545, seção 3.1)."""
+    chunks, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > 75:
+            chunks.append(current)
+            current, size = ' ', 1
+        current += char
+        size += char_size
+    chunks.append(current)
+    return '\r\n'.join(chunks) + '\r\n'
+
+def generate_teacher_ics(teacher, since):
+    """Gera o feed .ics do professor em partes, sem carregar todos os agendamentos na memória."""
+    dtstamp = (teacher.bookings_changed_at or datetime(1970, 1, 1)).strftime('%Y%m%dT%H%M%SZ')
+    yield ics_line('BEGIN:VCALENDAR')
+    yield ics_line('VERSION:2.0')
+    yield ics_line('PRODID:-//Agenda Escolar//Agendamentos//PT-BR')
+    yield ics_line('CALSCALE:GREGORIAN')
+    yield ics_line('METHOD:PUBLISH')
+    yield ics_line(f'X-WR-CALNAME:{ics_escape("Agenda Escolar - " + teacher.name)}')
+    yield ics_line(f'X-PUBLISHED-TTL:PT{CALENDAR_FEED_MAX_AGE // 60}M')
+
+    rows = db.session.query(Booking.id, Booking.date, Booking.shift, Booking.slot_name, Resource.name)\
+        .join(Resource, Booking.resource_id == Resource.id)\
+        .filter(Booking.teacher_id == teacher.id, Booking.status == 'booked', Booking.date >= since)\
+        .filter(Resource.deleted_at.is_(None))\
+        .order_by(Booking.date, Booking.shift, Booking.id)\
+        .yield_per(200)
+    for booking_id, booking_date, shift, slot_name, resource_name in rows:
+        # A grade de horários só tem nomes de aulas, então os eventos são de dia inteiro
+        yield ''.join([
+            ics_line('BEGIN:VEVENT'),
+            ics_line(f'UID:booking-{booking_id}@agenda-escolar'),
+            ics_line(f'DTSTAMP:{dtstamp}'),
+            ics_line(f'DTSTART;VALUE=DATE:{booking_date.strftime("%Y%m%d")}'),
+            ics_line(f'DTEND;VALUE=DATE:{(booking_date + timedelta(days=1)).strftime("%Y%m%d")}'),
+            ics_line(f'SUMMARY:{ics_escape(f"{resource_name} - {slot_name}")}'),
+            ics_line(f'DESCRIPTION:{ics_escape(f"Turno {shift.capitalize()}")}'),
+            ics_line('TRANSP:TRANSPARENT'),
+            ics_line('END:VEVENT'),
+        ])
+    yield ics_line('END:VCALENDAR')
+
+class BookingError(Exception):
+    """Falha de regra de negócio ao agendar, fechar ou remover um horário."""
+    def __init__(self, message, status_code, category='danger', booking=None, slot=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.category = category
+        self.booking = booking
+        self.slot = slot
+
+def booking_error_response(error):
+    """Converte um BookingError em resposta JSON, incluindo o estado atual do horário se houver."""
+    payload = {'error': error.message}
+    if error.slot is not None:
+        payload['slot'] = serialize_slot(error.slot, error.booking)
+    return jsonify(payload), error.status_code
+
+def serialize_slot(slot, booking, viewer=None):
+    """Monta o estado de um horário da grade para a API da agenda (do ponto de vista de viewer)."""
+    viewer = viewer or current_user
+    booked_by_name = None
+    if booking:
+        if booking.status == 'closed':
+            booked_by_name = 'Fechado'
+        else:
+            booked_by_name = booking.teacher_name
+
+    return {
+        'name': slot.get('name', 'Inválido'),
+        'type': slot.get('type', 'aula'),
+        'booked_by': booked_by_name,
+        'booking_id': booking.id if booking else None,
+        'is_mine': booking.teacher_id == viewer.id if booking else False,
+        'is_admin': viewer.is_admin
+    }
+
+def latest_change_seq():
+    return db.session.scalar(latest_change_seq_statement()) or 0
+
+def serialize_booking_change(change):
+    """Formato compacto de uma alteração para o /api/changes."""
+    booked_by = None
+    if change.op != 'delete':
+        booked_by = 'Fechado' if change.status == 'closed' else change.teacher_name
+    return {
+        'seq': change.seq,
+        'op': change.op,
+        'booking_id': change.booking_id,
+        'resource_id': change.resource_id,
+        'date': change.date.strftime('%Y-%m-%d'),
+        'shift': change.shift,
+        'slot_name': change.slot_name,
+        'booked_by': booked_by,
+        'status': None if change.op == 'delete' else change.status,
+        'is_mine': change.op != 'delete' and change.teacher_id == current_user.id
+    }
+
+def find_template_slot(resource_id, shift, slot_name):
+    """Procura o horário na grade do recurso/turno. Retorna None se não existir."""
+    template = ScheduleTemplate.query.join(Resource)\
+        .filter(ScheduleTemplate.resource_id == resource_id, ScheduleTemplate.shift == shift)\
+        .filter(Resource.deleted_at.is_(None)).first()
+    if template and isinstance(template.slots, list):
+        for slot in template.slots:
+            if isinstance(slot, dict) and slot.get('name') == slot_name:
+                return slot
+    return None
+
+def parse_slot_request(data):
+    """Extrai (resource_id, date, shift, slot_name) de um formulário ou JSON."""
+    try:
+        resource_id = int(data.get('resource_id'))
+        booking_date = datetime.strptime(data.get('date'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise BookingError('Recurso ou data inválidos.', 400)
+    shift, slot_name = data.get('shift'), data.get('slot_name')
+    if not shift or not slot_name:
+        raise BookingError('Turno e horário são obrigatórios.', 400)
+    return resource_id, booking_date, shift, slot_name
+
+def create_booking(resource_id, booking_date, shift, slot_name, teacher, status='booked'):
+    """Agenda (ou fecha) um horário livre e retorna (slot, booking). Faz commit."""
+    slot = find_template_slot(resource_id, shift, slot_name)
+    if slot is None or slot.get('type') == 'intervalo':
+        raise BookingError('Este horário não existe na grade do recurso.', 400)
+
+    existing = Booking.query.filter_by(resource_id=resource_id, date=booking_date, slot_name=slot_name, shift=shift).first()
+    if existing:
+        raise BookingError('Este horário já foi agendado ou fechado.', 409, 'warning', booking=existing, slot=slot)
+
+    booking = Booking(
+        resource_id=resource_id,
+        date=booking_date,
+        slot_name=slot_name,
+        shift=shift,
+        teacher_id=teacher.id,
+        teacher_name="Fechado" if status == 'closed' else teacher.name,
+        status=status
+    )
+    db.session.add(booking)
+    if status == 'booked':
+        touch_teacher_bookings([teacher.id])
+    invalidate_occupancy()
+    db.session.commit()
+    return slot, booking
+
+def remove_booking(booking):
+    """Remove o agendamento se o usuário tiver permissão e retorna o horário liberado. Faz commit."""
+    if not (current_user.is_admin or booking.teacher_id == current_user.id):
+        raise BookingError('Você não tem permissão para remover este agendamento.', 403)
+
+    slot = find_template_slot(booking.resource_id, booking.shift, booking.slot_name) or {'name': booking.slot_name, 'type': 'aula'}
+    touch_teacher_bookings([booking.teacher_id])
+    db.session.delete(booking)
+    invalidate_occupancy()
+    db.session.commit()
+    return slot
+
 # --- ROTAS DE AUTENTICAÇÃO ---
 
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve os bundles com hash, usando a variante .br/.gz pré-comprimida quando o cliente aceita."""
+    dist_dir = app.config['ASSETS_DIST_DIR']
+    served_name, encoding = assets.find_precompressed(dist_dir, filename, request.accept_encodings)
+    # O manifesto mantém o mesmo nome a cada build: só os bundles com hash podem ficar em cache
+    hashed = filename != assets.MANIFEST_NAME
+    response = send_from_directory(dist_dir, served_name, max_age=ASSETS_MAX_AGE if hashed else 0)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if hashed:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker do modo offline. Servido na raiz da escola para que o escopo dele cubra o app todo."""
+    response = send_from_directory(app.static_folder, 'js/sw.js', max_age=0)
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/manifest.webmanifest')
+def web_manifest():
+    """Manifesto do app instalável (PWA)."""
+    school = g.get('school')
+    name = 'Agenda Escolar' if not school or school['slug'] == app.config['DEFAULT_SCHOOL_SLUG'] else f"Agenda - {school['name']}"
+    manifest = {
+        'name': name,
+        'short_name': 'Agenda',
+        'start_url': url_for('home'),
+        'scope': request.script_root + '/',
+        'display': 'standalone',
+        'background_color': '#f8fafc',
+        'theme_color': '#2563eb',
+        'lang': 'pt-BR',
+        'icons': [{'src': url_for('static', filename='icons/icon.svg'), 'sizes': 'any', 'type': 'image/svg+xml', 'purpose': 'any'}],
+    }
+    return Response(json.dumps(manifest), mimetype='application/manifest+json')
+
 @app.route('/')
 def root():
     if current_user.is_authenticated:
@@ -127,7 +800,7 @@ def login():
 
     if request.method == 'POST':
         registration = request.form.get('registration')
-        teacher = Teacher.query.filter_by(registration=registration).first()
+        teacher = Teacher.active().filter_by(registration=registration).first()
 
         if teacher:
             login_user(teacher)
@@ -150,15 +823,16 @@ def logout():
 @app.route('/home')
 @login_required
 def home():
-    resources = Resource.query.order_by(Resource.sort_order, Resource.name).all()
-    return render_template('index.html', resources=resources)
+    resources = Resource.active().order_by(Resource.sort_order, Resource.name).all()
+    occupancy_day, occupancy = occupancy_summary()
+    return render_template('index.html', resources=resources, occupancy=occupancy,
+                           occupancy_day=occupancy_day, today=date.today())
 
 @app.route('/resource/<int:resource_id>')
 @login_required
 def select_shift(resource_id):
     """Esta rota agora carrega a nova página de agenda dinâmica."""
-    resource = Resource.query.get_or_404(resource_id)
-    teachers = Teacher.query.order_by(Teacher.name).all()
+    resource = Resource.active().filter_by(id=resource_id).first_or_404()
     
     # --- LÓGICA ATUALIZADA PARA A DATA INICIAL ---
     # Pega a data de hoje como base
@@ -174,7 +848,49 @@ def select_shift(resource_id):
         
     # O JavaScript dará prioridade ao parâmetro 'date' da URL,
     # então esta lógica só se aplica no primeiro acesso.
-    return render_template('agenda.html', resource=resource, teachers=teachers, current_date=initial_date)
+    # A lista de professores é buscada sob demanda (/api/teachers/search) quando o admin abre o modal
+    return render_template('agenda.html', resource=resource, current_date=initial_date)
+
+@app.route('/api/teachers/search')
+@login_required
+def search_teachers():
+    """Busca professores por prefixo do nome (sem acentos) ou da matrícula, para o seletor do admin."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    term = normalize_search_text(request.args.get('q', ''))
+    try:
+        limit = min(max(int(request.args.get('limit', TEACHER_SEARCH_LIMIT)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'Limite inválido'}), 400
+
+    query = Teacher.active()
+    if term:
+        # Escapa os curingas do LIKE para que o termo seja tratado literalmente
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        # Início de qualquer palavra do nome ou da matrícula, pelo índice de teacher_search_term.
+        # Ordena: matrícula exata, início do nome, início da matrícula, início de outra palavra do nome
+        term_rank = case(
+            (and_(TeacherSearchTerm.position.is_(None), TeacherSearchTerm.term == term), 0),
+            (TeacherSearchTerm.position == 0, 1),
+            (TeacherSearchTerm.position.is_(None), 2),
+            else_=3
+        )
+        matches = select(TeacherSearchTerm.teacher_id, func.min(term_rank).label('rank'))\
+            .where(TeacherSearchTerm.term.like(f'{escaped}%', escape='\\'))\
+            .group_by(TeacherSearchTerm.teacher_id)\
+            .subquery()
+        query = query.join(matches, matches.c.teacher_id == Teacher.id).order_by(matches.c.rank, Teacher.name)
+    else:
+        query = query.order_by(Teacher.name)
+
+    teachers = query.with_entities(Teacher.id, Teacher.name, Teacher.registration, Teacher.is_admin).limit(limit).all()
+    return jsonify([{
+        'id': teacher.id,
+        'name': teacher.name,
+        'registration': teacher.registration,
+        'is_admin': teacher.is_admin
+    } for teacher in teachers])
 
 @app.route('/api/agenda/<int:resource_id>/<string:date_str>')
 @login_required
@@ -185,43 +901,116 @@ def get_agenda_data(resource_id, date_str):
     except ValueError:
         return jsonify({'error': 'Formato de data inválido'}), 400
 
-    templates = ScheduleTemplate.query.filter_by(resource_id=resource_id).all()
-    bookings = Booking.query.filter_by(resource_id=resource_id, date=current_date).all()
-    
-    booked_slots = { (b.shift, b.slot_name): b for b in bookings }
-    
-    agenda_data = {}
-    for template in templates:
-        shift_slots = []
-        
-        if not isinstance(template.slots, list):
-            continue 
+    # Lido antes dos agendamentos: mudanças feitas durante a leitura serão reaplicadas pelo cliente
+    change_seq = latest_change_seq()
+    templates = db.session.scalars(agenda_templates_statement(resource_id)).all()
+    bookings = db.session.scalars(agenda_bookings_statement(resource_id, current_date)).all()
+    agenda_data = build_agenda_data(templates, bookings, current_user)
+
+    response = jsonify(agenda_data)
+    response.headers['X-Change-Seq'] = str(change_seq)
+    # O service worker revalida a cópia salva com If-None-Match (modo offline)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/availability/<int:resource_id>')
+@login_required
+def get_availability(resource_id):
+    """Horários livres, agendados e fechados por dia útil e turno (?start=AAAA-MM-DD&days=N)."""
+    try:
+        start, days = parse_availability_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
 
-        for slot in template.slots:
-            if not isinstance(slot, dict) or 'name' not in slot or 'type' not in slot:
-                continue
+    templates = db.session.scalars(agenda_templates_statement(resource_id)).all()
+    counts = db.session.execute(availability_statement(resource_id, start, start + timedelta(days=days - 1))).all()
+    return jsonify({'resource_id': resource_id, 'days': build_availability(templates, counts, start, days)})
 
-            booking = booked_slots.get((template.shift, slot['name']))
-            
-            booked_by_name = None
-            if booking:
-                if booking.status == 'closed':
-                    booked_by_name = 'Fechado'
-                else:
-                    booked_by_name = booking.teacher_name
-
-            slot_info = {
-                'name': slot.get('name', 'Inválido'),
-                'type': slot.get('type', 'aula'),
-                'booked_by': booked_by_name,
-                'booking_id': booking.id if booking else None,
-                'is_mine': booking.teacher_id == current_user.id if booking else False,
-                'is_admin': current_user.is_admin
-            }
-            shift_slots.append(slot_info)
-        agenda_data[template.shift] = shift_slots
+@app.route('/api/changes')
+@login_required
+def get_booking_changes():
+    """Retorna as alterações de agendamentos desde o 'seq' informado (opcionalmente de um recurso).
+
+    Se o cliente estiver atrás do log compactado ou à frente dele (ex.: após uma
+    restauração), a resposta traz reset=true e o cliente deve recarregar tudo.
+    """
+    try:
+        since = int(request.args.get('since', ''))
+        resource_id = int(request.args['resource']) if request.args.get('resource') else None
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
+
+    latest_seq = db.session.query(func.max(BookingChange.seq)).scalar() or 0
+    compacted_seq = db.session.query(BookingChangeCompaction.last_seq).scalar() or 0
+    if since > latest_seq or since < compacted_seq:
+        return jsonify({'changes': [], 'latest': latest_seq, 'reset': True})
+
+    query = BookingChange.query.filter(BookingChange.seq > since)
+    if resource_id is not None:
+        query = query.filter(or_(BookingChange.resource_id == resource_id, BookingChange.op == 'reset'))
+    changes = query.order_by(BookingChange.seq).limit(BOOKING_CHANGE_PAGE_SIZE).all()
+
+    if any(change.op == 'reset' for change in changes):
+        return jsonify({'changes': [], 'latest': latest_seq, 'reset': True})
+
+    # Se a página encheu, o cliente continua a partir do último 'seq' recebido
+    next_since = changes[-1].seq if len(changes) == BOOKING_CHANGE_PAGE_SIZE else latest_seq
+    return jsonify({
+        'changes': [serialize_booking_change(change) for change in changes],
+        'latest': next_since,
+        'more': len(changes) == BOOKING_CHANGE_PAGE_SIZE,
+        'reset': False
+    })
+
+@app.route('/api/agenda/book', methods=['POST'])
+@login_required
+def api_book_slot():
+    """Agenda um horário (JSON) e retorna o novo estado do horário."""
+    data = request.get_json(silent=True) or {}
+    try:
+        resource_id, booking_date, shift, slot_name = parse_slot_request(data)
+        book_for_teacher = current_user
+        if current_user.is_admin and data.get('teacher_id'):
+            book_for_teacher = Teacher.active().filter_by(id=int(data['teacher_id'])).first()
+            if book_for_teacher is None:
+                raise BookingError('Professor não encontrado.', 404)
+        slot, booking = create_booking(resource_id, booking_date, shift, slot_name, book_for_teacher)
+    except BookingError as e:
+        return booking_error_response(e)
+    except ValueError:
+        return jsonify({'error': 'Professor inválido.'}), 400
+    return jsonify({'message': 'Horário agendado com sucesso!', 'slot': serialize_slot(slot, booking)}), 201
+
+@app.route('/api/agenda/close', methods=['POST'])
+@login_required
+def api_close_slot():
+    """Marca um horário como fechado (JSON, apenas admin) e retorna o novo estado do horário."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    try:
+        resource_id, booking_date, shift, slot_name = parse_slot_request(request.get_json(silent=True) or {})
+        slot, booking = create_booking(resource_id, booking_date, shift, slot_name, current_user, status='closed')
+    except BookingError as e:
+        return booking_error_response(e)
+    return jsonify({'message': 'Horário marcado como fechado com sucesso!', 'slot': serialize_slot(slot, booking)}), 201
+
+@app.route('/api/agenda/booking/<int:booking_id>', methods=['DELETE'])
+@login_required
+def api_delete_booking(booking_id):
+    """Remove um agendamento (JSON) e retorna o horário liberado."""
+    booking = db.session.get(Booking, booking_id)
+    if booking is None:
+        return jsonify({'error': 'Agendamento não encontrado.'}), 404
+
+    try:
+        slot = remove_booking(booking)
+    except BookingError as e:
+        return booking_error_response(e)
+    return jsonify({'message': 'Agendamento removido com sucesso.', 'slot': serialize_slot(slot, None)})
 
-    return jsonify(agenda_data)
 @app.route('/agenda/close', methods=['POST'])
 @login_required
 def close_slot():
@@ -231,26 +1020,12 @@ def close_slot():
     resource_id = request.form.get('resource_id')
     date_str = request.form.get('date')
     shift = request.form.get('shift') # Captura o turno do formulário
-    slot_name = request.form.get('slot_name')
 
     try:
-        booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-        if Booking.query.filter_by(resource_id=resource_id, date=booking_date, slot_name=slot_name, shift=shift).first():
-            flash('Este horário já foi agendado ou fechado.', 'warning')
-        else:
-            new_booking = Booking(
-                resource_id=int(resource_id),
-                date=booking_date,
-                slot_name=slot_name,
-                shift=shift,
-                teacher_id=current_user.id,
-                teacher_name="Fechado",
-                status='closed'
-            )
-            db.session.add(new_booking)
-            db.session.commit()
-            flash('Horário marcado como fechado com sucesso!', 'success')
+        create_booking(*parse_slot_request(request.form), current_user, status='closed')
+        flash('Horário marcado como fechado com sucesso!', 'success')
+    except BookingError as e:
+        flash(e.message, e.category)
     except Exception as e:
         db.session.rollback()
         flash(f'Ocorreu um erro ao tentar fechar o horário: {e}', 'danger')
@@ -263,31 +1038,19 @@ def close_slot():
 def book_slot():
     resource_id = request.form.get('resource_id')
     date_str = request.form.get('date')
-    slot_name = request.form.get('slot_name')
     shift = request.form.get('shift') # Captura o turno do formulário
 
-    if Booking.query.filter_by(resource_id=resource_id, date=datetime.strptime(date_str, '%Y-%m-%d').date(), slot_name=slot_name, shift=shift).first():
-        flash('Este horário foi agendado por outra pessoa.', 'warning')
-        # Redireciona com 'date' e o 'shift'
-        return redirect(url_for('select_shift', resource_id=resource_id, date=date_str, shift=shift))
-
     book_for_teacher = current_user
     if current_user.is_admin:
         selected_teacher_id = request.form.get('teacher_id')
         if selected_teacher_id:
-            book_for_teacher = Teacher.query.get(int(selected_teacher_id))
+            book_for_teacher = Teacher.active().filter_by(id=int(selected_teacher_id)).first_or_404()
 
-    new_booking = Booking(
-        resource_id=int(resource_id),
-        date=datetime.strptime(date_str, '%Y-%m-%d').date(),
-        slot_name=slot_name,
-        shift=shift,
-        teacher_id=book_for_teacher.id,
-        teacher_name=book_for_teacher.name
-    )
-    db.session.add(new_booking)
-    db.session.commit()
-    flash('Horário agendado com sucesso!', 'success')
+    try:
+        create_booking(*parse_slot_request(request.form), book_for_teacher)
+        flash('Horário agendado com sucesso!', 'success')
+    except BookingError as e:
+        flash(e.message, e.category)
     # Redireciona com 'date' e o 'shift'
     return redirect(url_for('select_shift', resource_id=resource_id, date=date_str, shift=shift))
 
@@ -299,12 +1062,11 @@ def delete_booking(booking_id):
     date_str = request.args.get('date') 
     shift = request.args.get('shift') # Captura o turno da URL
 
-    if current_user.is_admin or booking.teacher_id == current_user.id:
-        db.session.delete(booking)
-        db.session.commit()
+    try:
+        remove_booking(booking)
         flash('Agendamento removido com sucesso.', 'success')
-    else:
-        flash('Você não tem permissão para remover este agendamento.', 'danger')
+    except BookingError as e:
+        flash(e.message, e.category)
     
     # Redireciona com 'date' e o 'shift'
     return redirect(url_for('select_shift', resource_id=resource_id, date=date_str, shift=shift))
@@ -314,7 +1076,7 @@ def delete_booking(booking_id):
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
-    resources = Resource.query.order_by(Resource.sort_order, Resource.name).all()
+    resources = Resource.active().order_by(Resource.sort_order, Resource.name).all()
     return render_template('admin_dashboard.html', resources=resources)
 
 @app.route('/admin/resources/reorder', methods=['POST'])
@@ -346,12 +1108,14 @@ def add_resource():
 @app.route('/admin/resource/edit/<int:resource_id>', methods=['POST'])
 @admin_required
 def edit_resource(resource_id):
-    resource = Resource.query.get_or_404(resource_id)
+    resource = Resource.active().filter_by(id=resource_id).first_or_404()
     name = request.form.get('name')
     if name:
         resource.name = name
         resource.description = request.form.get('description')
         resource.icon = request.form.get('icon') or 'bi-box'
+        # O nome do recurso aparece nos feeds .ics de quem tem agendamentos nele
+        touch_teacher_bookings(select(Booking.teacher_id).where(Booking.resource_id == resource_id))
         db.session.commit()
         flash('Recurso atualizado com sucesso!', 'success')
     else:
@@ -361,18 +1125,20 @@ def edit_resource(resource_id):
 @app.route('/admin/resource/delete/<int:resource_id>')
 @admin_required
 def delete_resource(resource_id):
-    Booking.query.filter_by(resource_id=resource_id).delete()
-    ScheduleTemplate.query.filter_by(resource_id=resource_id).delete()
-    resource = Resource.query.get_or_404(resource_id)
-    db.session.delete(resource)
+    """Oculta o recurso na hora; os agendamentos e o registro são apagados em segundo plano."""
+    resource = Resource.active().filter_by(id=resource_id).first_or_404()
+    resource.deleted_at = datetime.utcnow()
+    touch_teacher_bookings(select(Booking.teacher_id).where(Booking.resource_id == resource_id))
+    invalidate_occupancy()
     db.session.commit()
-    flash('Recurso e todos os seus dados foram removidos com sucesso!', 'success')
-    return redirect(url_for('admin_dashboard'))
+    task_id = enqueue_purge(purge_resource_task, resource_id)
+    flash('Recurso removido com sucesso! Os agendamentos dele estão sendo apagados em segundo plano.', 'success')
+    return redirect(url_for('admin_dashboard', task=task_id))
 
 @app.route('/admin/resource/copy/<int:original_id>', methods=['POST'])
 @admin_required
 def copy_resource(original_id):
-    original_resource = Resource.query.get_or_404(original_id)
+    original_resource = Resource.active().filter_by(id=original_id).first_or_404()
     new_name = request.form.get('new_name')
     new_icon = request.form.get('new_icon') or 'bi-box'
 
@@ -397,6 +1163,7 @@ def copy_resource(original_id):
         )
         db.session.add(new_template)
 
+    invalidate_occupancy()
     db.session.commit()
     flash(f'Recurso "{original_resource.name}" copiado com sucesso para "{new_name}"!', 'success')
     return redirect(url_for('admin_dashboard'))
@@ -404,7 +1171,7 @@ def copy_resource(original_id):
 @app.route('/admin/schedules/<int:resource_id>', methods=['GET', 'POST'])
 @admin_required
 def manage_schedules(resource_id):
-    resource = Resource.query.get_or_404(resource_id)
+    resource = Resource.active().filter_by(id=resource_id).first_or_404()
     if request.method == 'POST':
         shift = request.form.get('shift')
         slot_names = request.form.getlist('slot_name')
@@ -416,6 +1183,7 @@ def manage_schedules(resource_id):
         else:
             schedule = ScheduleTemplate(shift=shift, slots=slots_data, resource_id=resource_id)
             db.session.add(schedule)
+        invalidate_occupancy()
         db.session.commit()
         flash(f'Horários do turno {shift} para {resource.name} salvos com sucesso!', 'success')
         return redirect(url_for('manage_schedules', resource_id=resource_id))
@@ -434,30 +1202,36 @@ def manage_teachers():
         is_admin = 'is_admin' in request.form
         if not all([name, registration]):
             flash('Nome e matrícula são obrigatórios.', 'danger')
-        elif Teacher.query.filter_by(registration=registration).first():
+        elif Teacher.active().filter_by(registration=registration).first():
             flash('A matrícula informada já está cadastrada.', 'warning')
+        elif Teacher.query.filter_by(registration=registration).first():
+            flash(REGISTRATION_BEING_PURGED, 'warning')
         else:
             db.session.add(Teacher(name=name, registration=registration, is_admin=is_admin))
             db.session.commit()
             flash('Usuário cadastrado com sucesso!', 'success')
         return redirect(url_for('manage_teachers'))
-    teachers = Teacher.query.order_by(Teacher.name).all()
+    teachers = Teacher.active().order_by(Teacher.name).all()
     return render_template('admin_teachers.html', teachers=teachers)
 
 @app.route('/admin/teacher/edit/<int:teacher_id>', methods=['POST'])
 @admin_required
 def edit_teacher(teacher_id):
-    teacher = Teacher.query.get_or_404(teacher_id)
+    teacher = Teacher.active().filter_by(id=teacher_id).first_or_404()
     new_registration = request.form.get('registration')
     
     existing_teacher = Teacher.query.filter(Teacher.id != teacher_id, Teacher.registration == new_registration).first()
-    if existing_teacher:
+    if existing_teacher and existing_teacher.deleted_at is None:
         flash(f'A matrícula "{new_registration}" já está em uso por outro usuário.', 'danger')
         return redirect(url_for('manage_teachers'))
+    if existing_teacher:
+        flash(REGISTRATION_BEING_PURGED, 'warning')
+        return redirect(url_for('manage_teachers'))
 
     teacher.name = request.form.get('name')
     teacher.registration = new_registration
     teacher.is_admin = 'is_admin' in request.form
+    teacher.bookings_changed_at = datetime.utcnow() # O nome aparece no feed .ics
     db.session.commit()
     flash('Usuário atualizado com sucesso!', 'success')
     return redirect(url_for('manage_teachers'))
@@ -469,16 +1243,27 @@ def delete_teacher(teacher_id):
         flash('Você não pode se auto-excluir.', 'danger')
         return redirect(url_for('manage_teachers'))
         
-    teacher = Teacher.query.get_or_404(teacher_id)
-    Booking.query.filter_by(teacher_id=teacher_id).delete()
-    db.session.delete(teacher)
+    teacher = Teacher.active().filter_by(id=teacher_id).first_or_404()
+    teacher.deleted_at = datetime.utcnow()
     db.session.commit()
-    flash('Usuário e seus agendamentos foram removidos com sucesso.', 'success')
-    return redirect(url_for('manage_teachers'))
+    task_id = enqueue_purge(purge_teacher_task, teacher_id)
+    flash('Usuário removido com sucesso. Os agendamentos dele estão sendo apagados em segundo plano.', 'success')
+    return redirect(url_for('manage_teachers', task=task_id))
+
+@app.route('/admin/tasks/<string:task_id>')
+@admin_required
+def task_status(task_id):
+    """Informa o estado e o progresso de uma tarefa em segundo plano agendada pela escola."""
+    if BackgroundTask.query.filter_by(task_id=task_id).first() is None:
+        abort(404)
+    result = celery.AsyncResult(task_id)
+    progress = result.info if isinstance(result.info, dict) else None
+    return jsonify({'state': result.state, 'progress': progress})
 
 @app.route('/admin/weekly-view')
 @app.route('/admin/weekly-view/<string:date_str>')
 @admin_required
+@read_only
 def weekly_view(date_str=None):
     base_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
     start_of_week = base_date - timedelta(days=base_date.weekday())
@@ -490,8 +1275,10 @@ def weekly_view(date_str=None):
     day_map = {0: "Segunda", 1: "Terça", 2: "Quarta", 3: "Quinta", 4: "Sexta"}
     for i in range(5):
         current_day_date = start_of_week + timedelta(days=i)
-        week_headers.append({'name': day_map[i], 'date': current_day_date.strftime('%d/%m')})
+        week_headers.append({'name': day_map[i], 'date': current_day_date.strftime('%d/%m'), 'iso': current_day_date.strftime('%Y-%m-%d')})
         
+    # Lido antes dos agendamentos; a página aplica as alterações seguintes via /api/changes
+    change_seq = latest_change_seq()
     all_week_bookings = Booking.query.filter(Booking.date.between(start_of_week, end_of_week)).all()
     weekly_summaries = []
     
@@ -499,7 +1286,7 @@ def weekly_view(date_str=None):
     # 1. Lista de cores reordenada e com amarelo ('bg-warning') adicionado.
     colors = ['bg-success', 'bg-primary', 'bg-warning', 'bg-info', 'bg-secondary', 'bg-dark']
     
-    resources_with_schedules = Resource.query.join(ScheduleTemplate).order_by(Resource.sort_order, Resource.name).distinct()
+    resources_with_schedules = Resource.active().join(ScheduleTemplate).order_by(Resource.sort_order, Resource.name).distinct()
 
     # 2. Lógica de atribuição de cor usa 'enumerate' para ser mais estável.
     for index, resource in enumerate(resources_with_schedules):
@@ -523,13 +1310,14 @@ def weekly_view(date_str=None):
             
     return render_template('admin_weekly_view.html', weekly_summaries=weekly_summaries,
                            start_date_formatted=start_of_week.strftime('%d/%m/%Y'), end_date_formatted=end_of_week.strftime('%d/%m/%Y'),
-                           prev_week_link=prev_week_date, next_week_link=next_week_date)
+                           prev_week_link=prev_week_date, next_week_link=next_week_date, change_seq=change_seq)
 
 
 @app.route('/admin/reports', methods=['GET', 'POST'])
 @admin_required
+@read_only
 def reports():
-    resources = Resource.query.order_by(Resource.name).all()
+    resources = Resource.active().order_by(Resource.name).all()
     report_data, selected_resource_id, start_date_str, end_date_str = None, None, '', ''
     
     # --- NOVAS VARIÁVEIS PARA O GRÁFICO ---
@@ -570,24 +1358,70 @@ def reports():
 @app.route('/my-bookings')
 @login_required
 def my_bookings():
-    """Exibe os agendamentos futuros do usuário logado."""
-    today = date.today()
-    
+    """Exibe os agendamentos futuros do usuário logado, paginados por chave (date, shift, id)."""
     # Dicionário para traduzir os dias da semana
     weekdays_pt = {
         0: "Segunda-feira", 1: "Terça-feira", 2: "Quarta-feira", 
         3: "Quinta-feira", 4: "Sexta-feira", 5: "Sábado", 6: "Domingo"
     }
 
-    # Busca os agendamentos futuros do professor, juntando com os dados do recurso
-    bookings_query = db.session.query(Booking, Resource)\
-        .join(Resource, Booking.resource_id == Resource.id)\
-        .filter(Booking.teacher_id == current_user.id)\
-        .filter(Booking.date >= today)\
-        .order_by(Booking.date, Booking.shift)\
-        .all()
+    after_cursor = request.args.get('after')
+    try:
+        after = decode_booking_cursor(after_cursor) if after_cursor else None
+    except ValueError:
+        flash('Página inválida. Exibindo os primeiros agendamentos.', 'warning')
+        return redirect(url_for('my_bookings'))
+
+    # Busca uma página dos agendamentos futuros do professor, juntando com os dados do recurso
+    bookings, next_cursor = query_my_bookings(current_user.id, after=after)
+    calendar_feed_url = url_for('teacher_calendar_feed', token=calendar_serializer.dumps([g.school_id, current_user.id]), _external=True)
+
+    return render_template('my_bookings.html', bookings=bookings, weekdays_pt=weekdays_pt,
+                           next_cursor=next_cursor, is_first_page=after is None,
+                           calendar_feed_url=calendar_feed_url)
+
+@app.route('/api/my-bookings')
+@login_required
+def get_my_bookings_data():
+    """Retorna uma página dos agendamentos futuros do usuário em formato JSON."""
+    try:
+        after = decode_booking_cursor(request.args['after']) if request.args.get('after') else None
+        limit = min(max(int(request.args.get('limit', MY_BOOKINGS_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
 
-    return render_template('my_bookings.html', bookings=bookings_query, weekdays_pt=weekdays_pt)
+    bookings, next_cursor = query_my_bookings(current_user.id, after=after, limit=limit)
+    return jsonify({
+        'bookings': [serialize_my_booking(booking, resource) for booking, resource in bookings],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/calendar/<string:token>.ics')
+def teacher_calendar_feed(token):
+    """Feed iCalendar dos agendamentos do professor, para assinatura em apps de calendário."""
+    try:
+        school_id, teacher_id = calendar_serializer.loads(token)
+    except (BadSignature, TypeError, ValueError):
+        abort(404)
+    if school_id != g.school_id:
+        abort(404)
+    teacher = Teacher.active().filter_by(id=teacher_id).first_or_404()
+
+    # O conteúdo só muda quando os agendamentos do professor mudam ou quando a janela do feed avança
+    since = date.today() - timedelta(days=CALENDAR_FEED_PAST_DAYS)
+    changed_at = (teacher.bookings_changed_at or datetime(1970, 1, 1)).replace(tzinfo=timezone.utc)
+    etag = hashlib.sha1(f'{school_id}|{teacher.id}|{changed_at.isoformat()}|{since.isoformat()}'.encode()).hexdigest()
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=changed_at):
+        response = Response(status=304)
+    else:
+        response = Response(stream_with_context(generate_teacher_ics(teacher, since)),
+                            mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = changed_at
+    response.cache_control.private = True
+    response.cache_control.max_age = CALENDAR_FEED_MAX_AGE
+    return response
 
 @app.route('/my-bookings/delete/<int:booking_id>', methods=['POST'])
 @login_required
@@ -596,101 +1430,355 @@ def delete_my_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
 
     # Garante que o usuário só pode apagar seus próprios agendamentos
-    if booking.teacher_id == current_user.id or current_user.is_admin:
-        db.session.delete(booking)
-        db.session.commit()
+    try:
+        remove_booking(booking)
         flash('Agendamento removido com sucesso.', 'success')
-    else:
-        flash('Você não tem permissão para remover este agendamento.', 'danger')
+    except BookingError as e:
+        flash(e.message, e.category)
     
     return redirect(url_for('my_bookings'))
 
 # --- COMANDOS CLI ---
 @app.cli.command("seed-db")
-def seed_db_command():
-    """Cria o usuário administrador padrão se ele não existir."""
-    if not Teacher.query.filter_by(registration='7363').first():
-        admin_user = Teacher(
-            name='Jardel',
-            registration='7363',
-            is_admin=True
-        )
-        db.session.add(admin_user)
+@click.option('--school', 'slug', default=None, help='Slug da escola (padrão: DEFAULT_SCHOOL_SLUG).')
+def seed_db_command(slug):
+    """Cria a escola padrão e o usuário administrador padrão se eles não existirem."""
+    slug = slug or app.config['DEFAULT_SCHOOL_SLUG']
+    school = School.query.filter_by(slug=slug).first()
+    if school is None:
+        if slug != app.config['DEFAULT_SCHOOL_SLUG']:
+            raise click.ClickException(f'Escola "{slug}" não encontrada. Use `flask schools add`.')
+        school = School(slug=slug, name='Escola')
+        db.session.add(school)
         db.session.commit()
-        print('Usuário administrador padrão (Jardel) criado com sucesso.')
+        print(f'Escola padrão ({slug}) criada com sucesso.')
+
+    with tenancy.school_context(school.id):
+        if not Teacher.query.filter_by(registration='7363').first():
+            admin_user = Teacher(
+                name='Jardel',
+                registration='7363',
+                is_admin=True
+            )
+            db.session.add(admin_user)
+            db.session.commit()
+            print('Usuário administrador padrão (Jardel) criado com sucesso.')
+        else:
+            print('Usuário administrador padrão (Jardel) já existe.')
+
+@app.cli.group('schools')
+def schools_cli():
+    """Cadastro das escolas (tenants)."""
+
+@schools_cli.command('list')
+def list_schools_command():
+    """Lista as escolas cadastradas."""
+    for school in School.query.order_by(School.id).all():
+        database = 'banco próprio' if school.database_url else 'banco principal'
+        print(f'{school.id}\t{school.slug}\t{school.hostname or "-"}\t{database}\t{school.name}')
+
+@schools_cli.command('add')
+@click.argument('slug')
+@click.argument('name')
+@click.option('--hostname', default=None, help='Hostname próprio da escola (ex.: agenda.escola.com.br).')
+@click.option('--database-url', default=None, help='Banco separado para os dados da escola.')
+def add_school_command(slug, name, hostname, database_url):
+    """Cadastra uma escola. Com --database-url, rode depois `flask schools init-db`."""
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    school = School(slug=slug, name=name, hostname=hostname.lower() if hostname else None, database_url=database_url)
+    db.session.add(school)
+    db.session.commit()
+    tenancy.clear_school_cache()
+    print(f'Escola {school.id} ({slug}) cadastrada.')
+
+@schools_cli.command('init-db')
+@click.argument('slug')
+def init_school_db_command(slug):
+    """Cria as tabelas no banco próprio da escola e o marca com a última migração."""
+    school = School.query.filter_by(slug=slug).first()
+    if school is None or not school.database_url:
+        raise click.ClickException(f'A escola "{slug}" não existe ou usa o banco principal.')
+    tables = [table for table in db.metadata.sorted_tables if table.name != School.__tablename__]
+    db.metadata.create_all(tenancy.tenant_engine(school.database_url), tables=tables)
+    # As migrações seguintes chegam pelo `flask schools upgrade-db`
+    g.x_arg = [f'database_url={school.database_url}']
+    migrate_stamp()
+    print(f'Tabelas criadas no banco da escola {slug}.')
+
+def school_database_revision(database_url):
+    with tenancy.tenant_engine(database_url).connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+@schools_cli.command('upgrade-db')
+@click.argument('slug', required=False)
+@click.option('--from-revision', default=None,
+              help='Revisão em que estão os bancos criados por `init-db` sem versão registrada (antes de ele marcá-la).')
+def upgrade_school_dbs_command(slug, from_revision):
+    """Aplica as migrações (`flask db upgrade`) no banco próprio de cada escola, ou só no da escola indicada."""
+    query = School.query.filter(School.database_url.isnot(None))
+    if slug:
+        query = query.filter_by(slug=slug)
+    schools = query.order_by(School.id).all()
+    if slug and not schools:
+        raise click.ClickException(f'A escola "{slug}" não existe ou usa o banco principal.')
+    for school in schools:
+        g.x_arg = [f'database_url={school.database_url}']
+        if school_database_revision(school.database_url) is None:
+            if not from_revision:
+                print(f'Escola {school.slug}: banco sem versão registrada; informe --from-revision. Ignorado.')
+                continue
+            migrate_stamp(revision=from_revision)
+        migrate_upgrade()
+        print(f'Escola {school.slug}: banco atualizado.')
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Gera os bundles CSS/JS com hash em ASSETS_DIST_DIR (requer o Tailwind CLI)."""
+    manifest = assets.build_assets(app.config['ASSETS_DIST_DIR'])
+    for name, hashed in manifest.items():
+        print(f'{name} -> {hashed}')
+
+@app.cli.command("purge-deleted")
+def purge_deleted_command():
+    """Conclui na hora a remoção de recursos e professores ocultados (sem usar a fila)."""
+    for school_id in tenancy.all_school_ids():
+        with tenancy.school_context(school_id):
+            resource_ids = db.session.scalars(select(Resource.id).where(Resource.deleted_at.isnot(None))).all()
+            teacher_ids = db.session.scalars(select(Teacher.id).where(Teacher.deleted_at.isnot(None))).all()
+        for resource_id in resource_ids:
+            print(f'Escola {school_id}, recurso {resource_id}: {purge_resource_task.apply(args=[school_id, resource_id]).result}')
+        for teacher_id in teacher_ids:
+            print(f'Escola {school_id}, professor {teacher_id}: {purge_teacher_task.apply(args=[school_id, teacher_id]).result}')
+
+@app.cli.group('backups')
+def backups_cli():
+    """Repositório de backups deduplicado (o mesmo das tarefas agendadas)."""
+
+@backups_cli.command('run')
+def run_backups_command():
+    """Faz agora o backup de todos os bancos e aplica a retenção (sem usar a fila)."""
+    scheduled_backup_task.apply()
+    list_backups_command.callback()
+
+@backups_cli.command('list')
+def list_backups_command():
+    """Lista os snapshots de cada repositório."""
+    for store, _ in iter_backup_stores():
+        print(f'{store.path} ({store.stored_size()} bytes no disco)')
+        for snapshot in store.snapshots():
+            verified = {True: 'ok', False: 'FALHOU', None: 'não verificado'}[snapshot['verified']]
+            print(f"  {snapshot['id']}\t{snapshot['trigger']}\t{snapshot['size']} bytes\t{verified}")
+
+@backups_cli.command('verify')
+def verify_backups_command():
+    """Confere a integridade de todos os snapshots."""
+    verify_backups_task.apply()
+    list_backups_command.callback()
+
+@backups_cli.command('export')
+@click.argument('store_name')
+@click.argument('snapshot_id')
+@click.argument('filepath')
+def export_backup_command(store_name, snapshot_id, filepath):
+    """Remonta um snapshot em FILEPATH. STORE_NAME é o slug da escola ou _principal."""
+    if store_name == SHARED_BACKUP_STORE:
+        store = shared_backup_store()
     else:
-        print('Usuário administrador padrão (Jardel) já existe.')
+        school = tenancy.find_school('slug', store_name)
+        if school is None:
+            raise click.ClickException(f'A escola "{store_name}" não existe.')
+        with tenancy.school_context(school['id']):
+            store = school_backup_store()
+    try:
+        store.export(snapshot_id, filepath)
+    except backup_store.BackupError as e:
+        raise click.ClickException(str(e))
+    print(f'Snapshot {snapshot_id} gravado em {filepath}.')
+
+def school_database_uri():
+    """Banco com os dados da escola ativa: o próprio dela ou o principal."""
+    return g.school['database_url'] or app.config['SQLALCHEMY_DATABASE_URI']
+
+def school_backup_folder():
+    folder = os.path.join(BACKUP_FOLDER, g.school['slug'])
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def full_database_allowed():
+    """Backup/restauração do banco inteiro só quando ele não tem dados de outras escolas."""
+    return bool(g.school['database_url']) or len(tenancy.all_school_ids()) == 1
+
+def school_backup_store():
+    return backup_store.BackupStore(os.path.join(school_backup_folder(), 'store'))
+
+def shared_backup_store():
+    return backup_store.BackupStore(os.path.join(BACKUP_FOLDER, SHARED_BACKUP_STORE, 'store'))
+
+def iter_backup_stores():
+    """Ativa cada escola e retorna (repositório, banco) de cada banco, uma vez por banco.
+
+    O banco principal com dados de várias escolas vai para o repositório SHARED_BACKUP_STORE,
+    restaurado só pelo servidor (`flask backups export`).
+    """
+    shared_done = False
+    for school_id in tenancy.all_school_ids():
+        with tenancy.school_context(school_id):
+            if full_database_allowed():
+                yield school_backup_store(), school_database_uri()
+            elif not shared_done:
+                shared_done = True
+                yield shared_backup_store(), app.config['SQLALCHEMY_DATABASE_URI']
+
+def dump_database(db_uri, folder):
+    """Gera o arquivo de backup do banco em folder e retorna (caminho, nome, tipo)."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Lógica para PostgreSQL
+    if db_uri.startswith('postgresql'):
+        filename = f'backup_postgres_{timestamp}.sql'
+        filepath = os.path.join(folder, filename)
+
+        # Extrai os detalhes da conexão da URI
+        parsed_uri = urlparse(db_uri)
+        db_name = parsed_uri.path.lstrip('/')
+        user = parsed_uri.username
+        password = parsed_uri.password
+        host = parsed_uri.hostname
+        port = parsed_uri.port
+
+        # Define a variável de ambiente PGPASSWORD para segurança
+        env = os.environ.copy()
+        env['PGPASSWORD'] = password
+
+        # Comando para o pg_dump
+        command = [
+            'pg_dump',
+            '--host', host,
+            '--port', str(port),
+            '--username', user,
+            '--dbname', db_name,
+            '--no-password',
+            '--format=c', # Formato customizado, mais robusto
+            '--compress=0', # O repositório comprime os blocos; sem compressão aqui a deduplicação funciona
+            '--blobs',
+            '--no-owner',
+            '--file', filepath
+        ]
+
+        subprocess.run(command, check=True, env=env)
+        return filepath, filename, 'postgres'
+
+    # Lógica para SQLite
+    if db_uri.startswith('sqlite'):
+        filename = f'backup_sqlite_{timestamp}.db'
+        filepath = os.path.join(folder, filename)
+
+        # O caminho do DB SQLite está após 'sqlite:///'; a API de backup gera uma cópia consistente com o banco em uso
+        db_path = db_uri.split('///')[1]
+        with closing(sqlite3.connect(db_path)) as source, closing(sqlite3.connect(filepath)) as target:
+            source.backup(target)
+        return filepath, filename, 'sqlite'
+
+    raise ValueError('Tipo de banco de dados não suportado para backup.')
+
+def snapshot_database(store, db_uri, trigger):
+    """Gera o backup e o grava no repositório deduplicado; a cópia completa é apagada em seguida."""
+    with tempfile.TemporaryDirectory(dir=BACKUP_FOLDER) as tmp_folder:
+        filepath, filename, kind = dump_database(db_uri, tmp_folder)
+        return store.add_snapshot(filepath, filename, kind, trigger)
+
+def prune_backups(store):
+    return store.prune(app.config['BACKUP_KEEP_DAILY'], app.config['BACKUP_KEEP_WEEKLY'], app.config['BACKUP_KEEP_MONTHLY'])
+
+def full_database_required(f):
+    """Rotas de backup/restauração: só para escolas cujo banco não tem dados de outras escolas."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not full_database_allowed():
+            flash('O banco principal é compartilhado com outras escolas; backup e restauração completos são feitos pelo servidor.', 'danger')
+            return redirect(url_for('backup_restore_page'))
+        return f(*args, **kwargs)
+    return decorated_function
 
 @app.route('/admin/backup-restore')
 @admin_required
 def backup_restore_page():
-    """Renderiza a página de backup e restauração."""
-    return render_template('admin_backup_restore.html')
+    """Renderiza a página de backup e restauração, com os snapshots do repositório da escola."""
+    snapshots, stored_size = [], 0
+    if full_database_allowed():
+        store = school_backup_store()
+        snapshots, stored_size = store.snapshots(), store.stored_size()
+    for snapshot in snapshots:
+        snapshot['created_local'] = datetime.fromisoformat(snapshot['created_at']).astimezone()
+    return render_template('admin_backup_restore.html',
+                           backups_allowed=full_database_allowed(),
+                           snapshots=snapshots,
+                           stored_size=stored_size,
+                           logical_size=sum(snapshot['size'] for snapshot in snapshots))
 
 @app.route('/admin/backup')
 @admin_required
+@full_database_required
 def backup_database():
-    """Cria um backup do banco de dados e o oferece para download."""
-    db_uri = app.config['SQLALCHEMY_DATABASE_URI']
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
+    """Agenda um snapshot do banco da escola; a página acompanha a tarefa e oferece o download ao final."""
     try:
-        # Lógica para PostgreSQL
-        if db_uri.startswith('postgresql'):
-            filename = f'backup_postgres_{timestamp}.sql'
-            filepath = os.path.join(BACKUP_FOLDER, filename)
-            
-            # Extrai os detalhes da conexão da URI
-            parsed_uri = urlparse(db_uri)
-            db_name = parsed_uri.path.lstrip('/')
-            user = parsed_uri.username
-            password = parsed_uri.password
-            host = parsed_uri.hostname
-            port = parsed_uri.port
-
-            # Define a variável de ambiente PGPASSWORD para segurança
-            env = os.environ.copy()
-            env['PGPASSWORD'] = password
+        task_id = enqueue_task(manual_backup_task)
+    except TASK_QUEUE_ERRORS as e:
+        flash(f'Erro ao agendar o backup: {str(e)}', 'danger')
+        return redirect(url_for('backup_restore_page'))
+    flash('Backup iniciado em segundo plano. O link para baixá-lo aparece aqui assim que ele terminar.', 'success')
+    return redirect(url_for('backup_restore_page', task=task_id))
 
-            # Comando para o pg_dump
-            command = [
-                'pg_dump',
-                '--host', host,
-                '--port', str(port),
-                '--username', user,
-                '--dbname', db_name,
-                '--no-password',
-                '--format=c', # Formato customizado, mais robusto
-                '--blobs',
-                '--no-owner',
-                '--file', filepath
-            ]
-            
-            subprocess.run(command, check=True, env=env)
-            flash('Backup do PostgreSQL gerado com sucesso!', 'success')
-            
-        # Lógica para SQLite
-        elif db_uri.startswith('sqlite'):
-            filename = f'backup_sqlite_{timestamp}.db'
-            filepath = os.path.join(BACKUP_FOLDER, filename)
-            
-            # O caminho do DB SQLite está após 'sqlite:///'
-            db_path = db_uri.split('///')[1]
-            shutil.copy2(db_path, filepath)
-            flash('Backup do SQLite gerado com sucesso!', 'success')
-            
-        else:
-            flash('Tipo de banco de dados não suportado para backup.', 'danger')
-            return redirect(url_for('backup_restore_page'))
-            
-        return send_from_directory(BACKUP_FOLDER, filename, as_attachment=True)
+@app.route('/admin/backups/<string:snapshot_id>/download')
+@admin_required
+@full_database_required
+def download_backup(snapshot_id):
+    """Remonta o snapshot a partir dos blocos, sem gravar a cópia completa no disco."""
+    stream = school_backup_store().stream_snapshot(snapshot_id)
+    try:
+        manifest = next(stream) # Trava o repositório até o fim do download
+    except backup_store.BackupError as e:
+        flash(f'Não foi possível baixar o backup: {e}', 'danger')
+        return redirect(url_for('backup_restore_page'))
+    response = Response(stream_with_context(stream), mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = f"attachment; filename={manifest['filename']}"
+    response.headers['Content-Length'] = str(manifest['size'])
+    return response
 
-    except Exception as e:
-        flash(f'Erro ao gerar o backup: {str(e)}', 'danger')
+@app.route('/admin/backups/<string:snapshot_id>/verify', methods=['POST'])
+@admin_required
+@full_database_required
+def verify_backup(snapshot_id):
+    """Agenda a conferência de todos os blocos do snapshot; a página acompanha a tarefa."""
+    try:
+        school_backup_store().load(snapshot_id)
+    except backup_store.BackupError:
+        abort(404)
+    try:
+        task_id = enqueue_task(verify_backup_task, snapshot_id)
+    except TASK_QUEUE_ERRORS as e:
+        flash(f'Erro ao agendar a verificação: {str(e)}', 'danger')
         return redirect(url_for('backup_restore_page'))
+    flash(f'Verificação do backup {snapshot_id} iniciada em segundo plano.', 'success')
+    return redirect(url_for('backup_restore_page', task=task_id))
+
+@app.route('/admin/backups/<string:snapshot_id>/restore', methods=['POST'])
+@admin_required
+@full_database_required
+def restore_backup_snapshot(snapshot_id):
+    """Agenda a restauração de um snapshot do repositório em segundo plano."""
+    try:
+        school_backup_store().load(snapshot_id)
+    except backup_store.BackupError:
+        abort(404)
+    restore_snapshot_task.delay(g.school_id, snapshot_id)
+    flash('Restauração iniciada em segundo plano! O processo pode levar alguns minutos para ser concluído.', 'success')
+    return redirect(url_for('backup_restore_page'))
 
 @app.route('/admin/restore', methods=['POST'])
 @admin_required
+@full_database_required
 def restore_database():
     """Salva o arquivo e agenda a restauração em segundo plano."""
     if 'backup_file' not in request.files:
@@ -704,13 +1792,13 @@ def restore_database():
 
     if file:
         filename = secure_filename(file.filename)
-        filepath = os.path.join(BACKUP_FOLDER, filename)
+        filepath = os.path.join(school_backup_folder(), filename)
         file.save(filepath)
         
-        db_uri_str = app.config['SQLALCHEMY_DATABASE_URI']
+        db_uri_str = school_database_uri()
 
         # Chama a tarefa em segundo plano, passando o caminho do arquivo
-        restore_task_bg.delay(filepath, db_uri_str)
+        restore_task_bg.delay(g.school_id, filepath, db_uri_str)
         
         flash('Restauração iniciada em segundo plano! O processo pode levar alguns minutos para ser concluído.', 'success')
 
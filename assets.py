@@ -0,0 +1,203 @@
+"""Pipeline de arquivos estáticos: gera os bundles CSS/JS com nomes por hash de conteúdo.
+
+O comando `flask build-assets` baixa as bibliotecas de terceiros (versões fixas),
+compila o Tailwind só com as classes usadas nos templates, junta tudo em poucos
+arquivos em ASSETS_DIST_DIR e grava um manifest.json que o helper `asset_url`
+usa para resolver o nome com hash.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import subprocess
+import urllib.request
+from urllib.parse import urljoin, urlparse
+
+try:
+    import brotli
+except ImportError: # A variante .br é opcional
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError: # Sem o rjsmin, o JS próprio vai sem minificação
+    rjsmin = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+VENDOR_CACHE_DIR = os.path.join(BASE_DIR, 'assets', 'vendor')
+TAILWIND_CONFIG = os.path.join(BASE_DIR, 'tailwind.config.js')
+MANIFEST_NAME = 'manifest.json'
+
+CDN = 'https://cdn.jsdelivr.net/npm/'
+
+# Cada bundle é a concatenação, na ordem, das partes listadas.
+# 'url' é baixado uma vez para assets/vendor; 'static' é um arquivo de static/
+# (também servido diretamente quando não há build); 'tailwind' é a saída do
+# Tailwind CLI para o arquivo de entrada em assets/.
+BUNDLES = {
+    'app.css': [
+        {'url': CDN + 'bootstrap@5.3.3/dist/css/bootstrap.min.css'},
+        {'url': CDN + 'bootstrap-icons@1.11.3/font/bootstrap-icons.min.css'},
+        {'url': CDN + '@fontsource-variable/inter@5.1.0/index.css'},
+        {'url': CDN + '@fontsource-variable/noto-sans@5.1.0/index.css'},
+        {'url': CDN + 'material-symbols@0.27.0/outlined.css'},
+        {'url': CDN + 'flatpickr@4.6.13/dist/flatpickr.min.css'},
+        {'tailwind': 'tailwind.css'},
+    ],
+    'app.js': [
+        {'url': CDN + 'bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js'},
+        {'url': CDN + 'imask@7.6.1/dist/imask.min.js'},
+        {'url': CDN + 'flatpickr@4.6.13/dist/flatpickr.min.js'},
+        {'url': CDN + 'sortablejs@1.15.6/Sortable.min.js'},
+        {'static': 'js/app.js'},
+        {'static': 'js/offline.js'},
+    ],
+    'charts.js': [
+        {'url': CDN + 'chart.js@4.4.6/dist/chart.umd.js'},
+    ],
+}
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*(?:"([^"]*)"|\'([^\']*)\'|([^\'")\s]+))\s*\)')
+
+_manifest_cache = {}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name, data):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{content_hash(data)}{ext}'
+
+
+def fetch_vendor(url):
+    """Baixa (ou lê do cache local) um arquivo de terceiros com versão fixa."""
+    parsed = urlparse(url)
+    cache_path = os.path.join(VENDOR_CACHE_DIR, parsed.netloc, parsed.path.lstrip('/'))
+    if not os.path.exists(cache_path):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=60) as response:
+            data = response.read()
+        with open(cache_path, 'wb') as f:
+            f.write(data)
+    with open(cache_path, 'rb') as f:
+        return f.read()
+
+
+def rewrite_css_urls(css, base_url, dist_dir, outputs):
+    """Baixa as fontes/imagens referenciadas por url(...) e aponta para a cópia local com hash."""
+    def replace(match):
+        reference = next(group for group in match.groups() if group is not None).strip()
+        if reference.startswith('data:'):
+            return match.group(0)
+        url = urljoin(base_url, reference).split('#')[0].split('?')[0]
+        data = fetch_vendor(url)
+        name = hashed_name(os.path.basename(urlparse(url).path), data)
+        write_output(dist_dir, os.path.join('fonts', name), data, outputs, compress=False)
+        # Os bundles ficam na raiz de dist, então o caminho relativo é fonts/<nome>
+        return f'url(fonts/{name})'
+    return CSS_URL_PATTERN.sub(replace, css.decode('utf-8')).encode('utf-8')
+
+
+def run_tailwind(src_name):
+    """Compila o CSS do Tailwind removendo as classes não usadas nos templates."""
+    tailwind_bin = os.environ.get('TAILWIND_BIN', 'tailwindcss')
+    command = [
+        tailwind_bin,
+        '--config', TAILWIND_CONFIG,
+        '--input', os.path.join(ASSETS_DIR, src_name),
+        '--minify'
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, cwd=BASE_DIR)
+    return result.stdout
+
+
+def write_output(dist_dir, relative_path, data, outputs, compress=True):
+    """Grava o arquivo e, se indicado, as variantes pré-comprimidas .gz e .br."""
+    path = os.path.join(dist_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    outputs.add(relative_path)
+    if not compress:
+        return
+    # mtime=0 deixa o .gz reprodutível entre builds
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    outputs.add(relative_path + '.gz')
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        outputs.add(relative_path + '.br')
+
+
+def build_bundle(bundle_name, parts, dist_dir, outputs):
+    is_css = bundle_name.endswith('.css')
+    chunks = []
+    for part in parts:
+        if 'url' in part:
+            data = fetch_vendor(part['url'])
+            if is_css:
+                data = rewrite_css_urls(data, part['url'], dist_dir, outputs)
+        elif 'tailwind' in part:
+            data = run_tailwind(part['tailwind'])
+        else:
+            with open(os.path.join(STATIC_DIR, part['static']), 'rb') as f:
+                data = f.read()
+            if not is_css and rjsmin is not None:
+                data = rjsmin.jsmin(data)
+        chunks.append(data.strip())
+    # O ';' evita que um arquivo sem ponto e vírgula final se junte ao próximo
+    separator = b'\n' if is_css else b';\n'
+    data = separator.join(chunks) + b'\n'
+    name = hashed_name(bundle_name, data)
+    write_output(dist_dir, name, data, outputs)
+    return name
+
+
+def build_assets(dist_dir):
+    """Gera todos os bundles em dist_dir, grava o manifesto e remove arquivos de builds anteriores."""
+    os.makedirs(dist_dir, exist_ok=True)
+    outputs = set()
+    manifest = {}
+    for bundle_name, parts in BUNDLES.items():
+        manifest[bundle_name] = build_bundle(bundle_name, parts, dist_dir, outputs)
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    outputs.add(MANIFEST_NAME)
+
+    for root, _, files in os.walk(dist_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, dist_dir) not in outputs:
+                os.remove(path)
+    _manifest_cache.clear()
+    return manifest
+
+
+def load_manifest(dist_dir):
+    """Lê o manifesto gerado pelo build (com cache por mtime). Retorna {} se não houver build."""
+    path = os.path.join(dist_dir, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+
+def find_precompressed(dist_dir, filename, accept_encoding):
+    """Escolhe a melhor variante pré-comprimida aceita pelo cliente: (arquivo, encoding)."""
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accept_encoding and os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
@@ -0,0 +1,307 @@
+"""Repositório local de backups com deduplicação e política de retenção.
+
+Cada backup (snapshot) é dividido em blocos definidos pelo conteúdo (content-defined
+chunking com gear hash): uma alteração no meio do arquivo muda só os blocos em volta,
+e os blocos iguais entre snapshots são gravados uma única vez. Os blocos ficam
+comprimidos (zlib) em chunks/<2 primeiros>/<sha256 do bloco original>, e cada snapshot
+é um manifesto JSON em snapshots/ com a lista de blocos e o SHA-256 do arquivo inteiro,
+conferidos na verificação e ao restaurar.
+
+A retenção segue o esquema avô-pai-filho (GFS): o snapshot mais recente de cada um
+dos últimos N dias, semanas e meses é mantido; blocos sem snapshot são apagados.
+"""
+import os
+import re
+import json
+import zlib
+import fcntl
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Tamanhos dos blocos: mínimo, máximo e média (2^16 = 64 KiB) pela máscara de corte.
+# Não mudar estes valores nem a tabela GEAR: os blocos novos deixariam de coincidir
+# com os já gravados (nada se perde, só a deduplicação com os snapshots antigos).
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+CUT_MASK = ((1 << 16) - 1) << 48 # Bits altos: dependem dos últimos 64 bytes
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+HASH_BITS = (1 << 64) - 1
+
+READ_SIZE = 8 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+SNAPSHOT_ID_FORMAT = '%Y%m%d-%H%M%S'
+SNAPSHOT_ID_PATTERN = re.compile(r'\d{8}-\d{6}(-\d+)?')
+
+
+class BackupError(Exception):
+    """Snapshot inexistente ou com blocos ausentes/corrompidos."""
+
+
+def find_cut(data, start=0):
+    """Posição (em `data`) do fim do bloco que começa em `start` (no máximo MAX_CHUNK_SIZE depois)."""
+    end = min(len(data), start + MAX_CHUNK_SIZE)
+    position = start + MIN_CHUNK_SIZE
+    if position >= end:
+        return end
+    gear, fingerprint = GEAR, 0
+    # Percorre uma memoryview: nem a fatia nem o acesso por índice copiam ou conferem limites
+    for byte in memoryview(data)[position:end]:
+        fingerprint = ((fingerprint << 1) + gear[byte]) & HASH_BITS
+        position += 1
+        if not fingerprint & CUT_MASK:
+            return position
+    return end
+
+
+def iter_chunks(stream):
+    """Divide o conteúdo do arquivo aberto em blocos definidos pelo conteúdo.
+
+    Os blocos são memoryviews do buffer de leitura: cortar não copia os dados.
+    """
+    buffer, offset = b'', 0
+    while True:
+        data = stream.read(READ_SIZE)
+        # Descarta o já cortado só a cada leitura, não a cada bloco
+        buffer = buffer[offset:] + data
+        offset = 0
+        view = memoryview(buffer)
+        # Só corta com dados suficientes para um bloco máximo (ou no fim do arquivo)
+        while len(buffer) - offset >= MAX_CHUNK_SIZE or (not data and offset < len(buffer)):
+            cut = find_cut(buffer, offset)
+            yield view[offset:cut]
+            offset = cut
+        if not data:
+            return
+
+
+def select_retained(snapshots, daily, weekly, monthly):
+    """Ids a manter pela regra GFS: o mais recente de cada um dos últimos N dias, semanas e meses."""
+    newest_first = sorted(snapshots, key=lambda snapshot: snapshot['created_at'], reverse=True)
+    periods = (
+        (daily, lambda created: created.date()),
+        (weekly, lambda created: created.isocalendar()[:2]),
+        (monthly, lambda created: (created.year, created.month)),
+    )
+    retained = set(snapshot['id'] for snapshot in newest_first[:1]) # O último nunca é apagado
+    for count, period_of in periods:
+        seen = set()
+        for snapshot in newest_first:
+            period = period_of(datetime.fromisoformat(snapshot['created_at']))
+            if period in seen:
+                continue
+            if len(seen) == count:
+                break
+            seen.add(period)
+            retained.add(snapshot['id'])
+    return retained
+
+
+class BackupStore:
+    """Repositório de um banco (uma pasta com chunks/ e snapshots/)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks_dir = os.path.join(path, 'chunks')
+        self.snapshots_dir = os.path.join(path, 'snapshots')
+
+    @contextmanager
+    def locked(self, shared=False):
+        """Trava o repositório: exclusiva para gravar e apagar, compartilhada (shared=True) para ler.
+
+        A trava é do arquivo aberto, não do processo: quem já a tem não deve pedi-la de novo.
+        """
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        with open(os.path.join(self.path, 'lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def manifest_path(self, snapshot_id):
+        if not SNAPSHOT_ID_PATTERN.fullmatch(snapshot_id or ''):
+            raise BackupError(f'Snapshot inválido: {snapshot_id}')
+        return os.path.join(self.snapshots_dir, f'{snapshot_id}.json')
+
+    def write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def save_manifest(self, manifest):
+        data = json.dumps(manifest, indent=1).encode()
+        self.write_atomic(self.manifest_path(manifest['id']), data)
+
+    def new_snapshot_id(self, created_at):
+        base_id = snapshot_id = created_at.strftime(SNAPSHOT_ID_FORMAT)
+        suffix = 1
+        while os.path.exists(self.manifest_path(snapshot_id)):
+            suffix += 1
+            snapshot_id = f'{base_id}-{suffix}'
+        return snapshot_id
+
+    def add_snapshot(self, filepath, filename, kind, trigger):
+        """Grava o arquivo como um novo snapshot e retorna o manifesto."""
+        with self.locked():
+            created_at = datetime.now(timezone.utc)
+            manifest = {
+                'id': self.new_snapshot_id(created_at),
+                'created_at': created_at.isoformat(),
+                'filename': filename,
+                'kind': kind,
+                'trigger': trigger,
+                'size': 0,
+                'stored_bytes': 0, # Bytes comprimidos de blocos que ainda não existiam
+                'chunks': [],
+                'verified_at': None,
+                'verified': None,
+            }
+            file_hash = hashlib.sha256()
+            with open(filepath, 'rb') as stream:
+                for chunk in iter_chunks(stream):
+                    digest = hashlib.sha256(chunk).hexdigest()
+                    path = self.chunk_path(digest)
+                    if not os.path.exists(path):
+                        compressed = zlib.compress(chunk, COMPRESSION_LEVEL)
+                        self.write_atomic(path, compressed)
+                        manifest['stored_bytes'] += len(compressed)
+                    file_hash.update(chunk)
+                    manifest['size'] += len(chunk)
+                    manifest['chunks'].append(digest)
+            manifest['sha256'] = file_hash.hexdigest()
+            # O manifesto por último: um snapshot só aparece depois de todos os blocos gravados
+            self.save_manifest(manifest)
+        return manifest
+
+    def load(self, snapshot_id):
+        try:
+            with open(self.manifest_path(snapshot_id)) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            raise BackupError(f'Snapshot {snapshot_id} não encontrado.')
+
+    def read_manifests(self):
+        """Manifestos do repositório, do mais recente para o mais antigo (sem travar)."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        manifests = []
+        for name in os.listdir(self.snapshots_dir):
+            snapshot_id = name[:-len('.json')]
+            if not name.endswith('.json') or not SNAPSHOT_ID_PATTERN.fullmatch(snapshot_id):
+                continue
+            try:
+                manifests.append(self.load(snapshot_id))
+            except BackupError:
+                continue # Apagado pela retenção depois da listagem do diretório
+        return sorted(manifests, key=lambda manifest: manifest['created_at'], reverse=True)
+
+    def snapshots(self):
+        """Manifestos do repositório, do mais recente para o mais antigo."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        with self.locked(shared=True):
+            return self.read_manifests()
+
+    def iter_snapshot(self, snapshot_id):
+        """Conteúdo original do snapshot, bloco a bloco, conferindo cada bloco e o arquivo inteiro."""
+        manifest = self.load(snapshot_id)
+        file_hash = hashlib.sha256()
+        for digest in manifest['chunks']:
+            try:
+                with open(self.chunk_path(digest), 'rb') as chunk_file:
+                    chunk = zlib.decompress(chunk_file.read())
+            except (OSError, zlib.error) as e:
+                raise BackupError(f'Bloco {digest} do snapshot {snapshot_id} ilegível: {e}')
+            if hashlib.sha256(chunk).hexdigest() != digest:
+                raise BackupError(f'Bloco {digest} do snapshot {snapshot_id} corrompido.')
+            file_hash.update(chunk)
+            yield chunk
+        if file_hash.hexdigest() != manifest['sha256']:
+            raise BackupError(f'O snapshot {snapshot_id} não confere com o original.')
+
+    def stream_snapshot(self, snapshot_id):
+        """Conteúdo do snapshot para download, lido com a trava compartilhada.
+
+        O primeiro next() trava o repositório, confere que todos os blocos existem e
+        retorna o manifesto (antes de enviar os cabeçalhos); os seguintes retornam o
+        conteúdo. A retenção não apaga blocos até o gerador terminar ou ser fechado.
+        """
+        with self.locked(shared=True):
+            manifest = self.load(snapshot_id)
+            missing = [digest for digest in manifest['chunks'] if not os.path.exists(self.chunk_path(digest))]
+            if missing:
+                raise BackupError(f'O snapshot {snapshot_id} tem {len(missing)} blocos ausentes.')
+            yield manifest
+            yield from self.iter_snapshot(snapshot_id)
+
+    def export(self, snapshot_id, filepath):
+        """Remonta o arquivo original do snapshot em filepath (não deixa arquivo parcial se falhar)."""
+        try:
+            with self.locked(shared=True), open(filepath, 'wb') as output:
+                for chunk in self.iter_snapshot(snapshot_id):
+                    output.write(chunk)
+        except BaseException:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            raise
+
+    def verify(self, snapshot_id):
+        """Confere todos os blocos do snapshot e grava o resultado no manifesto. Retorna (ok, erro)."""
+        # A leitura dos blocos só trava contra a retenção; backups e downloads seguem em paralelo
+        with self.locked(shared=True):
+            try:
+                for _ in self.iter_snapshot(snapshot_id):
+                    pass
+                ok, error = True, None
+            except BackupError as e:
+                ok, error = False, str(e)
+        with self.locked():
+            manifest = self.load(snapshot_id)
+            manifest.update(verified_at=datetime.now(timezone.utc).isoformat(timespec='seconds'), verified=ok)
+            self.save_manifest(manifest)
+        return ok, error
+
+    def prune(self, daily, weekly, monthly):
+        """Aplica a retenção GFS e apaga os blocos que nenhum snapshot usa. Retorna (snapshots, blocos) removidos."""
+        with self.locked():
+            snapshots = self.read_manifests()
+            retained = select_retained(snapshots, daily, weekly, monthly)
+            removed = [snapshot for snapshot in snapshots if snapshot['id'] not in retained]
+            for snapshot in removed:
+                os.remove(self.manifest_path(snapshot['id']))
+
+            used = set()
+            for snapshot in snapshots:
+                if snapshot['id'] in retained:
+                    used.update(snapshot['chunks'])
+            removed_chunks = 0
+            for prefix in os.listdir(self.chunks_dir):
+                prefix_dir = os.path.join(self.chunks_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    # Temporários sobram só de gravações interrompidas (a trava impede uma em andamento)
+                    if name not in used:
+                        os.remove(os.path.join(prefix_dir, name))
+                        removed_chunks += not name.startswith('.tmp-')
+        return len(removed), removed_chunks
+
+    def stored_size(self):
+        """Espaço em disco ocupado pelos blocos."""
+        total = 0
+        if os.path.isdir(self.chunks_dir):
+            with self.locked(shared=True):
+                for prefix in os.listdir(self.chunks_dir):
+                    prefix_dir = os.path.join(self.chunks_dir, prefix)
+                    total += sum(os.path.getsize(os.path.join(prefix_dir, name)) for name in os.listdir(prefix_dir))
+        return total
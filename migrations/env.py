@@ -2,6 +2,7 @@ import logging
 from logging.config import fileConfig
 
 from flask import current_app
+from sqlalchemy import create_engine, pool
 
 from alembic import context
 
@@ -24,7 +25,14 @@ def get_engine():
         return current_app.extensions['migrate'].db.engine
 
 
+# Banco de uma escola com banco próprio: `flask db -x database_url=<url> upgrade`
+# (ou `flask schools upgrade-db`, que faz isso para cada escola)
+tenant_database_url = context.get_x_argument(as_dictionary=True).get('database_url')
+
+
 def get_engine_url():
+    if tenant_database_url:
+        return tenant_database_url.replace('%', '%%')
     try:
         return get_engine().url.render_as_string(hide_password=False).replace(
             '%', '%%')
@@ -94,7 +102,10 @@ def run_migrations_online():
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
-    connectable = get_engine()
+    if tenant_database_url:
+        connectable = create_engine(tenant_database_url, poolclass=pool.NullPool)
+    else:
+        connectable = get_engine()
 
     with connectable.connect() as connection:
         context.configure(
@@ -1,18 +1,99 @@
+import unicodedata
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from read_replica import RoutingSession
 
-# Inicializa o objeto do banco de dados
-db = SQLAlchemy()
+# Inicializa o objeto do banco de dados (a sessão pode ler da réplica, ver read_replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def normalize_search_text(text):
+    """Remove acentos, caixa e espaços repetidos para buscas por prefixo."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(without_accents.casefold().split())
+
+# Cadastro das escolas (tenants). Fica sempre no banco principal, mesmo quando os
+# dados de uma escola estão em outro banco (database_url).
+class School(db.Model):
+    __shared__ = True # Nunca roteada para o banco de uma escola
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False) # Usado no caminho /s/<slug>/
+    name = db.Column(db.String(150), nullable=False)
+    hostname = db.Column(db.String(255), unique=True) # Ex.: agenda.escola-a.com.br
+    database_url = db.Column(db.String(500)) # Vazio = banco principal compartilhado
+
+class TenantMixin:
+    """Marca tabelas com dados de uma escola. O filtro por school_id é aplicado em tenancy.py.
+
+    Sem ForeignKey para school: o cadastro de escolas não existe nos bancos de escolas separadas.
+    """
+    school_id = db.Column(db.Integer, nullable=False, index=True)
+
+class SoftDeleteMixin:
+    """Permite ocultar o registro na hora e apagá-lo depois, em segundo plano."""
+    deleted_at = db.Column(db.DateTime)
+
+    @classmethod
+    def active(cls):
+        """Consulta apenas os registros que não foram marcados como removidos."""
+        return cls.query.filter(cls.deleted_at.is_(None))
 
 # A tabela Teacher foi simplificada, removendo os campos de senha
-class Teacher(UserMixin, db.Model):
+class Teacher(TenantMixin, SoftDeleteMixin, UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
-    registration = db.Column(db.String(50), unique=True, nullable=False)
+    registration = db.Column(db.String(50), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # Marca a última alteração nos agendamentos do professor (usado no ETag do feed .ics)
+    bookings_changed_at = db.Column(db.DateTime)
+    # A matrícula é única dentro de cada escola
+    __table_args__ = (
+        db.UniqueConstraint('school_id', 'registration', name='_school_registration_uc'),
+    )
+
+    def get_id(self):
+        # A escola entra no id da sessão: ids de bancos de escolas diferentes podem coincidir
+        return f'{self.school_id}:{self.id}'
+
+# Termos de busca do professor: o nome normalizado a partir de cada palavra ("ana maria
+# silva", "maria silva", "silva") e a matrícula. Assim a busca pelo início de qualquer
+# palavra é um LIKE 'termo%', que usa o índice (text_pattern_ops no PostgreSQL).
+class TeacherSearchTerm(db.Model):
+    __tablename__ = 'teacher_search_term'
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id', ondelete='CASCADE'), nullable=False, index=True)
+    term = db.Column(db.String(150), nullable=False)
+    position = db.Column(db.Integer) # Palavra do nome em que o termo começa (0 = nome inteiro); vazio na matrícula
+    __table_args__ = (
+        db.Index('ix_teacher_search_term_term', 'term', postgresql_ops={'term': 'text_pattern_ops'}),
+    )
+
+def teacher_search_terms(name, registration):
+    """Pares (termo, posição) do professor; a posição é None para a matrícula."""
+    words = normalize_search_text(name).split()
+    terms = [(' '.join(words[i:]), i) for i in range(len(words))]
+    registration = normalize_search_text(registration)
+    if registration:
+        terms.append((registration, None))
+    return terms
+
+@db.event.listens_for(Teacher, 'after_insert')
+@db.event.listens_for(Teacher, 'after_update')
+def update_teacher_search_terms(mapper, connection, teacher):
+    term_table = TeacherSearchTerm.__table__
+    connection.execute(term_table.delete().where(term_table.c.teacher_id == teacher.id))
+    connection.execute(term_table.insert(), [
+        {'teacher_id': teacher.id, 'term': term, 'position': position}
+        for term, position in teacher_search_terms(teacher.name, teacher.registration)])
+
+@db.event.listens_for(Teacher, 'before_delete')
+def delete_teacher_search_terms(mapper, connection, teacher):
+    term_table = TeacherSearchTerm.__table__
+    connection.execute(term_table.delete().where(term_table.c.teacher_id == teacher.id))
 
 # Tabela de Recursos (Salas/Equipamentos)
-class Resource(db.Model):
+class Resource(TenantMixin, SoftDeleteMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(200))
@@ -23,7 +104,7 @@ class Resource(db.Model):
     schedule_templates = db.relationship('ScheduleTemplate', backref='resource', lazy=True, cascade='all, delete-orphan')
 
 # Tabela para Estrutura de Horário (ligada ao Recurso)
-class ScheduleTemplate(db.Model):
+class ScheduleTemplate(TenantMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     resource_id = db.Column(db.Integer, db.ForeignKey('resource.id'), nullable=False)
     shift = db.Column(db.String(50), nullable=False)  # "matutino" ou "vespertino"
@@ -32,7 +113,7 @@ class ScheduleTemplate(db.Model):
     __table_args__ = (db.UniqueConstraint('resource_id', 'shift', name='_resource_shift_uc'),)
 
 # Tabela para Agendamentos
-class Booking(db.Model):
+class Booking(TenantMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     resource_id = db.Column(db.Integer, db.ForeignKey('resource.id'), nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
@@ -41,4 +122,105 @@ class Booking(db.Model):
     shift = db.Column(db.String(50), nullable=False)
     slot_name = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(50), nullable=False, default='booked') # 'booked' ou 'closed'
+    # Índice usado pela paginação por chave (date, shift, id) de "Meus Agendamentos"
+    # e índice por recurso/data usado pela agenda diária e pela remoção em lotes
+    __table_args__ = (
+        db.Index('ix_booking_teacher_date_shift_id', 'teacher_id', 'date', 'shift', 'id'),
+        db.Index('ix_booking_resource_date', 'resource_id', 'date'),
+    )
+
+
+# Log somente de inclusão com todas as mudanças de agendamentos. O 'seq' cresce sempre,
+# então os clientes pedem apenas o que mudou desde o último 'seq' que viram.
+class BookingChange(TenantMixin, db.Model):
+    __tablename__ = 'booking_change'
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    op = db.Column(db.String(10), nullable=False) # 'insert', 'update', 'delete' ou 'reset'
+    booking_id = db.Column(db.Integer)
+    resource_id = db.Column(db.Integer)
+    teacher_id = db.Column(db.Integer)
+    teacher_name = db.Column(db.String(150))
+    date = db.Column(db.Date)
+    shift = db.Column(db.String(50))
+    slot_name = db.Column(db.String(100))
+    status = db.Column(db.String(50))
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # No SQLite, AUTOINCREMENT impede que um 'seq' seja reutilizado após a compactação
+    __table_args__ = (db.Index('ix_booking_change_resource_seq', 'resource_id', 'seq'), {'sqlite_autoincrement': True})
+
+class BookingChangeCompaction(TenantMixin, db.Model):
+    """Maior 'seq' já apagado do log de cada escola pela compactação.
+
+    O 'seq' é um só para todas as escolas do banco: o menor 'seq' restante de uma
+    escola não indica se algo dela foi apagado antes.
+    """
+    __tablename__ = 'booking_change_compaction'
+    id = db.Column(db.Integer, primary_key=True)
+    last_seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), nullable=False)
+    __table_args__ = (db.UniqueConstraint('school_id', name='_booking_change_compaction_school_uc'),)
+
+class OccupancyVersion(TenantMixin, db.Model):
+    """Versão do resumo de ocupação da escola, trocada na mesma transação de cada gravação
+    de agendamentos, grades ou recursos. Cada processo guarda o resumo junto com a versão
+    em que foi calculado, então a troca invalida o cache de todos os workers de uma vez.
+    """
+    __tablename__ = 'occupancy_version'
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+
+class BackgroundTask(TenantMixin, db.Model):
+    """Tarefa do Celery agendada por uma escola; /admin/tasks/<id> só informa as da própria escola."""
+    __tablename__ = 'background_task'
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(36), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+BOOKING_CHANGE_COLUMNS = ('school_id', 'resource_id', 'teacher_id', 'teacher_name', 'date', 'shift', 'slot_name', 'status')
+BOOKING_CHANGE_LOCK_ID = 0x626B6367 # Primeira chave do advisory lock do PostgreSQL ('bkcg'); a segunda é a escola
+
+def lock_booking_changes(connection, school_id):
+    """No PostgreSQL, serializa quem grava no log da escola para que a ordem do 'seq' seja a ordem de commit.
+
+    Sem isso, um cliente poderia ler o seq 12 antes do 11 ser confirmado e pular o 11. A trava é
+    por escola, então gravações de escolas diferentes não esperam umas pelas outras: o 'seq' só
+    segue a ordem de commit dentro de cada escola, e os clientes só o comparam com os da própria
+    escola (/api/changes).
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.execute(db.text('SELECT pg_advisory_xact_lock(:key, :school_id)'),
+                           {'key': BOOKING_CHANGE_LOCK_ID, 'school_id': school_id})
+
+def record_booking_change(connection, op, booking):
+    lock_booking_changes(connection, booking.school_id)
+    values = {column: getattr(booking, column) for column in BOOKING_CHANGE_COLUMNS}
+    connection.execute(BookingChange.__table__.insert().values(
+        op=op, booking_id=booking.id, changed_at=datetime.utcnow(), **values))
+
+def record_bulk_booking_deletes(connection, school_id, booking_ids):
+    """Registra a remoção de vários agendamentos da escola de uma vez (antes do DELETE em lote)."""
+    lock_booking_changes(connection, school_id)
+    booking = Booking.__table__
+    columns = [booking.c[column] for column in BOOKING_CHANGE_COLUMNS]
+    source = db.select(db.literal('delete'), booking.c.id, db.literal(datetime.utcnow()), *columns)\
+        .where(booking.c.id.in_(booking_ids))
+    connection.execute(BookingChange.__table__.insert().from_select(
+        ['op', 'booking_id', 'changed_at', *BOOKING_CHANGE_COLUMNS], source))
+
+def record_booking_reset(connection, school_id):
+    """Avisa os clientes da escola que todo o estado mudou (ex.: após restaurar um backup)."""
+    lock_booking_changes(connection, school_id)
+    connection.execute(BookingChange.__table__.insert().values(op='reset', school_id=school_id, changed_at=datetime.utcnow()))
+
+# Toda alteração de Booking feita pelo ORM entra no log na mesma transação
+@db.event.listens_for(Booking, 'after_insert')
+def log_booking_insert(mapper, connection, booking):
+    record_booking_change(connection, 'insert', booking)
+
+@db.event.listens_for(Booking, 'after_update')
+def log_booking_update(mapper, connection, booking):
+    record_booking_change(connection, 'update', booking)
 
+@db.event.listens_for(Booking, 'after_delete')
+def log_booking_delete(mapper, connection, booking):
+    record_booking_change(connection, 'delete', booking)
@@ -0,0 +1,141 @@
+"""Roteamento opcional das leituras pesadas para uma réplica (DATABASE_READ_URL).
+
+Rotas marcadas com @read_only (ou blocos dentro de `with replica_reads():`) leem da
+réplica. Escritas sempre vão para o primário, assim como as leituras de um usuário
+logo depois de ele mesmo gravar algo (read-your-writes). Se a réplica estiver fora
+do ar ou atrasada demais, tudo volta para o primário.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from logging import getLogger
+
+REPLICA_BIND = 'replica'
+
+# Estado da réplica por processo: evita consultar o atraso a cada requisição
+_replica_status = {'checked_at': float('-inf'), 'healthy': False}
+
+POSTGRES_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class RoutingSession(Session):
+    """Sessão que usa o banco da escola ativa, se ela tiver um (tenancy.py), ou a réplica
+    enquanto a leitura na réplica estiver ativa (exceto em flush)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('tenant_engine') is not None:
+            # Só o cadastro de escolas (__shared__) continua no banco principal
+            if not getattr(getattr(mapper, 'class_', None), '__shared__', False):
+                return g.tenant_engine
+        if bind is None and not self._flushing and has_app_context() and g.get('use_replica'):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_write(session_, flush_context):
+    if has_app_context():
+        g.wrote_to_primary = True
+
+
+def init_app(app):
+    """Registra a marcação de escritas do usuário (read-your-writes) na sessão do Flask."""
+    @app.after_request
+    def mark_recent_write(response):
+        if g.get('wrote_to_primary'):
+            session['last_write_at'] = time.time()
+        if g.get('used_replica'):
+            response.headers['X-DB-Route'] = 'replica'
+        return response
+
+
+def replica_configured():
+    return REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def measure_replica_lag(connection):
+    """Atraso da réplica em segundos (0 quando não há como medir, ex.: cópia do SQLite)."""
+    if connection.dialect.name != 'postgresql':
+        connection.execute(text('SELECT 1'))
+        return 0
+    return float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0)
+
+
+def mark_replica_down():
+    _replica_status.update(checked_at=time.monotonic(), healthy=False)
+
+
+def replica_available():
+    """Verifica (com cache) se a réplica responde e está dentro do atraso máximo."""
+    config = current_app.config
+    now = time.monotonic()
+    interval = config['REPLICA_CHECK_INTERVAL'] if _replica_status['healthy'] else config['REPLICA_RETRY_AFTER']
+    if now - _replica_status['checked_at'] < interval:
+        return _replica_status['healthy']
+
+    engine = current_app.extensions['sqlalchemy'].engines[REPLICA_BIND]
+    try:
+        with engine.connect() as connection:
+            lag = measure_replica_lag(connection)
+        healthy = lag <= config['REPLICA_MAX_LAG_SECONDS']
+        if not healthy:
+            getLogger(__name__).warning(f"Réplica atrasada {lag:.1f}s; leituras vão para o primário.")
+    except SQLAlchemyError as e:
+        getLogger(__name__).warning(f"Réplica indisponível; leituras vão para o primário: {e}")
+        healthy = False
+    _replica_status.update(checked_at=now, healthy=healthy)
+    return healthy
+
+
+def should_use_replica():
+    # A réplica é só do banco principal; escolas com banco próprio leem dele
+    if not replica_configured() or g.get('tenant_engine') is not None:
+        return False
+    # Quem acabou de gravar lê do primário, para ver a própria alteração
+    if has_request_context():
+        last_write_at = session.get('last_write_at', 0)
+        if time.time() - last_write_at < current_app.config['READ_YOUR_WRITES_SECONDS']:
+            return False
+    return replica_available()
+
+
+@contextmanager
+def replica_reads():
+    """Executa o bloco lendo da réplica, quando ela estiver disponível para este usuário."""
+    if g.get('use_replica') or not should_use_replica():
+        yield
+        return
+    g.use_replica = True
+    g.used_replica = True
+    try:
+        yield
+    finally:
+        g.use_replica = False
+
+
+def read_only(view):
+    """Marca uma rota como somente leitura; se a réplica falhar no meio, repete no primário."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not should_use_replica():
+            return view(*args, **kwargs)
+        try:
+            with replica_reads():
+                return view(*args, **kwargs)
+        except DBAPIError as e:
+            getLogger(__name__).warning(f"Falha na réplica durante {view.__name__}; repetindo no primário: {e}")
+            mark_replica_down()
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.used_replica = False
+            return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,64 @@
+// Scripts comuns a todas as páginas (entram no bundle app.js de `flask build-assets`)
+
+const datepickerElements = document.querySelectorAll(".datepicker");
+
+datepickerElements.forEach(function(element) {
+    
+    // --- NOVA ABORDAGEM PARA A MÁSCARA ---
+    const maskOptions = {
+        // Usamos um padrão de string, que é mais explícito e confiável
+        mask: 'DD/MM/YYYY',
+        lazy: false,
+        blocks: {
+            // Os nomes dos blocos (DD, MM, YYYY) devem corresponder ao usado na máscara
+            DD: {
+                mask: IMask.MaskedRange,
+                from: 1,
+                to: 31,
+                maxLength: 2,
+                placeholderChar: 'd' // Opcional: mostra "dd/mm/aaaa"
+            },
+            MM: {
+                mask: IMask.MaskedRange,
+                from: 1,
+                to: 12,
+                maxLength: 2,
+                placeholderChar: 'm'
+            },
+            YYYY: {
+                mask: IMask.MaskedRange,
+                from: 1900,
+                to: 2999,
+                placeholderChar: 'a'
+            }
+        }
+    };
+    
+    const mask = IMask(element, maskOptions);
+
+    // Lógica para alternar a cor do texto (cinza/preto)
+    mask.on('complete', function () {
+        element.classList.add('is-complete');
+    });
+    mask.on('accept', function () {
+        if (mask.masked.rawInputValue === '') {
+            element.classList.remove('is-complete');
+        }
+    });
+
+    // A configuração do Flatpickr continua a mesma
+    flatpickr(element, {
+        dateFormat: "d/m/Y",
+        locale: {
+            firstDayOfWeek: 0,
+            weekdays: { shorthand: ["Dom", "Seg", "Ter", "Qua", "Qui", "Sex", "Sáb"] },
+            months: { longhand: ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"] },
+        },
+        onClose: function(selectedDates, dateStr, instance) {
+            mask.updateValue();
+            if (mask.masked.isComplete) {
+                element.classList.add('is-complete');
+            }
+        }
+    });
+});
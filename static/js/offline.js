@@ -0,0 +1,193 @@
+// Modo offline (entra no bundle app.js de `flask build-assets`)
+//
+// Registra o service worker (sw.js) e mantém no IndexedDB a fila das ações feitas sem
+// conexão. A fila é reenviada, na ordem, quando a conexão volta ou numa próxima visita.
+// Os conflitos (ex.: alguém agendou o horário antes) ficam no aviso #offline-status até
+// o usuário dispensá-los. A agenda usa window.AgendaOffline para enfileirar as ações e
+// recebe o resultado de cada reenvio pelo evento 'agenda-offline-result'.
+(function () {
+    const DB_NAME = 'agenda-offline';
+    const STORE = 'queue';
+    // "<escola>:<professor>" do usuário logado (base.html); as ações de outro usuário esperam o login dele
+    const USER_KEY = typeof AGENDA_USER !== 'undefined' ? AGENDA_USER : null;
+    const CONFLICTS_KEY = `agenda-offline-conflicts:${USER_KEY}`;
+    const statusContainer = document.getElementById('offline-status');
+
+    function openDb() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, 1);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore(STORE, { keyPath: 'id', autoIncrement: true });
+                store.createIndex('user', 'user');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async function run(mode, operation) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(STORE, mode);
+            const request = operation(transaction.objectStore(STORE));
+            transaction.oncomplete = () => { db.close(); resolve(request.result); };
+            transaction.onerror = transaction.onabort = () => { db.close(); reject(transaction.error); };
+        });
+    }
+
+    // Ações pendentes do usuário, na ordem em que foram feitas
+    function list() {
+        if (!USER_KEY) return Promise.resolve([]);
+        return run('readonly', store => store.index('user').getAll(USER_KEY));
+    }
+
+    async function enqueue(intent) {
+        const id = await run('readwrite', store => store.add({ ...intent, user: USER_KEY, createdAt: Date.now() }));
+        renderStatus();
+        return id;
+    }
+
+    async function remove(id) {
+        await run('readwrite', store => store.delete(id));
+        renderStatus();
+    }
+
+    // Reenvio de uma ação que já tinha chegado ao servidor (ex.: a conexão caiu antes da resposta)
+    function alreadyApplied(item, status, data) {
+        if (item.method === 'DELETE') return status === 404;
+        return status === 409 && data.slot && data.slot.booked_by === item.slotState.booked_by;
+    }
+
+    async function replayQueue() {
+        for (const item of await list()) {
+            let response;
+            try {
+                response = await fetch(APP_ROOT + item.path, {
+                    method: item.method,
+                    headers: { 'Content-Type': 'application/json' },
+                    body: item.body ? JSON.stringify(item.body) : undefined
+                });
+            } catch (error) {
+                return; // Ainda sem conexão: tenta de novo no próximo 'online'
+            }
+            // Redirecionado para o login (sessão expirada) ou erro do servidor: a ação continua na fila
+            if (response.redirected || response.status >= 500) return;
+
+            const data = await response.json().catch(() => ({}));
+            const ok = response.ok || alreadyApplied(item, response.status, data);
+            await run('readwrite', store => store.delete(item.id));
+            if (!ok) {
+                addConflict(`${item.label}: ${data.error || 'não foi possível concluir a ação.'}`);
+            }
+            window.dispatchEvent(new CustomEvent('agenda-offline-result', { detail: { item, ok, data } }));
+        }
+    }
+
+    let replaying = null;
+    function replay() {
+        if (!USER_KEY || !navigator.onLine) return Promise.resolve();
+        if (!replaying) {
+            // O lock evita que duas abas reenviem a mesma ação
+            const task = () => replayQueue();
+            replaying = (navigator.locks ? navigator.locks.request('agenda-offline-queue', task) : task())
+                .catch(error => console.error(error))
+                .finally(() => {
+                    replaying = null;
+                    renderStatus();
+                });
+        }
+        return replaying;
+    }
+
+    function loadConflicts() {
+        try {
+            return JSON.parse(localStorage.getItem(CONFLICTS_KEY)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    function addConflict(message) {
+        localStorage.setItem(CONFLICTS_KEY, JSON.stringify([...loadConflicts(), message]));
+    }
+
+    function statusBox(classes, text) {
+        const box = document.createElement('div');
+        box.className = `pointer-events-auto mx-auto max-w-2xl flex items-start gap-3 p-3 rounded-lg border-l-4 shadow ${classes}`;
+        const paragraph = document.createElement('p');
+        paragraph.className = 'flex-grow text-sm';
+        paragraph.textContent = text;
+        box.appendChild(paragraph);
+        return box;
+    }
+
+    async function renderStatus() {
+        if (!statusContainer) return;
+        const pending = USER_KEY ? (await list().catch(() => [])).length : 0;
+        const conflicts = loadConflicts();
+        statusContainer.innerHTML = '';
+
+        if (!navigator.onLine || pending) {
+            let text = 'Sem conexão. Exibindo a última versão salva neste aparelho.';
+            if (pending) {
+                const actions = pending === 1 ? '1 ação aguardando' : `${pending} ações aguardando`;
+                text = navigator.onLine ? `${actions} envio...` : `Sem conexão. ${actions} a conexão voltar para serem enviadas.`;
+            }
+            statusContainer.appendChild(statusBox('bg-yellow-100 border-yellow-500 text-yellow-700', text));
+        }
+
+        if (conflicts.length) {
+            const box = statusBox('bg-red-100 border-red-500 text-red-700',
+                'Ações feitas sem conexão que não puderam ser enviadas:\n' + conflicts.map(message => `• ${message}`).join('\n'));
+            box.firstChild.classList.add('whitespace-pre-line');
+            const dismiss = document.createElement('button');
+            dismiss.type = 'button';
+            dismiss.className = 'text-red-700 font-bold';
+            dismiss.title = 'Dispensar';
+            dismiss.innerHTML = '&times;';
+            dismiss.addEventListener('click', () => {
+                localStorage.removeItem(CONFLICTS_KEY);
+                renderStatus();
+            });
+            box.appendChild(dismiss);
+            statusContainer.appendChild(box);
+        }
+    }
+
+    async function registerServiceWorker() {
+        if (!('serviceWorker' in navigator) || !window.isSecureContext) return;
+        try {
+            const registration = await navigator.serviceWorker.register(`${APP_ROOT}/sw.js`, { scope: `${APP_ROOT}/` });
+            await navigator.serviceWorker.ready;
+            // Arquivos desta página carregados antes de o service worker assumir o controle
+            const urls = performance.getEntriesByType('resource')
+                .filter(entry => ['script', 'link', 'css'].includes(entry.initiatorType))
+                .map(entry => entry.name);
+            if (USER_KEY && /\/resource\/\d+$/.test(location.pathname)) urls.push(location.href);
+            registration.active.postMessage({ type: 'cache-urls', urls });
+        } catch (error) {
+            console.error(error);
+        }
+    }
+
+    // Na tela de login (depois de sair ou com a sessão expirada) apaga as páginas e agendas
+    // salvas, mesmo que o service worker ainda não controle a página
+    function clearSavedPages() {
+        if (USER_KEY || !window.caches) return;
+        const scope = `${location.origin}${APP_ROOT}/`;
+        caches.keys()
+            .then(names => Promise.all(names.filter(name => name.endsWith(`:${scope}`)).map(name => caches.delete(name))))
+            .catch(error => console.error(error));
+    }
+
+    window.AgendaOffline = { enqueue, list, remove, replay };
+
+    window.addEventListener('online', replay);
+    window.addEventListener('offline', renderStatus);
+    window.addEventListener('load', () => {
+        clearSavedPages();
+        registerServiceWorker();
+        replay();
+    });
+    renderStatus();
+})();
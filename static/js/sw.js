@@ -0,0 +1,145 @@
+// Service worker da agenda (servido em <raiz da escola>/sw.js, ver a rota `service_worker`)
+//
+// - Agenda de um recurso (/resource/<id>): network-first. Vem sempre da rede, porque traz
+//   as mensagens flash da sessão, e a última versão salva só é usada sem conexão. As
+//   outras páginas (inclusive as de administração) nunca são salvas.
+// - Ao sair (ou ao abrir o login) os caches deste escopo são apagados: são do usuário anterior.
+// - /api/agenda/...: stale-while-revalidate. A revalidação usa o ETag do servidor; se o
+//   conteúdo mudou, as páginas abertas recebem 'agenda-updated' e redesenham a lista.
+// - Bundles com hash (/assets/) ficam no cache para sempre; static/ e os CDNs são revalidados.
+// As ações feitas sem conexão não passam por aqui: ficam na fila do IndexedDB (offline.js).
+
+const CACHE_VERSION = 'v1';
+const SCOPE = self.registration.scope; // Termina com '/', inclui o prefixo /s/<slug> da escola
+const SHELL_CACHE = `agenda-shell-${CACHE_VERSION}:${SCOPE}`;
+const DATA_CACHE = `agenda-data-${CACHE_VERSION}:${SCOPE}`;
+const MAX_AGENDA_ENTRIES = 60; // Respostas de agenda (recurso + data) mantidas no cache
+const CDN_HOSTS = ['cdn.jsdelivr.net', 'cdn.tailwindcss.com', 'fonts.googleapis.com', 'fonts.gstatic.com'];
+
+const scopePath = new URL(SCOPE).pathname;
+const AGENDA_API = new RegExp(`^${scopePath}api/agenda/\\d+/\\d{4}-\\d{2}-\\d{2}$`);
+const AGENDA_PAGE = new RegExp(`^${scopePath}resource/\\d+$`);
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        // Remove os caches de versões anteriores deste escopo
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name.endsWith(`:${SCOPE}`) && name !== SHELL_CACHE && name !== DATA_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+// A página avisa quais arquivos ela carregou antes de o service worker assumir o controle
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'cache-urls') {
+        event.waitUntil(caches.open(SHELL_CACHE).then(cache => Promise.all(event.data.urls.map(async url => {
+            if (!isShellUrl(new URL(url)) || await cache.match(url)) return;
+            const response = await fetch(url, { mode: new URL(url).origin === self.location.origin ? 'same-origin' : 'no-cors' });
+            if (isCacheable(response)) await cache.put(url, response);
+        }).map(promise => promise.catch(() => {})))));
+    }
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin) {
+        if (!url.pathname.startsWith(scopePath)) return;
+        // As escolas acessadas por /s/<slug>/ têm o próprio service worker
+        if (scopePath === '/' && url.pathname.startsWith('/s/')) return;
+        if (request.mode === 'navigate') {
+            if (url.pathname === `${scopePath}logout` || url.pathname === `${scopePath}login`) {
+                // Os dados salvos são do usuário que está saindo (ou cuja sessão expirou)
+                event.waitUntil(clearCaches());
+                return;
+            }
+            event.respondWith(AGENDA_PAGE.test(url.pathname) ? networkFirst(request) : fetch(request).catch(offlineResponse));
+        } else if (AGENDA_API.test(url.pathname)) {
+            event.respondWith(staleWhileRevalidate(event, DATA_CACHE, { notify: true }));
+        } else if (url.pathname.startsWith(`${scopePath}assets/`)) {
+            event.respondWith(cacheFirst(request));
+        } else if (url.pathname.startsWith(`${scopePath}static/`)) {
+            event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+        }
+    } else if (CDN_HOSTS.includes(url.hostname)) {
+        event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+    }
+});
+
+// Endereços que podem entrar no SHELL_CACHE: a agenda, os arquivos estáticos e os CDNs
+function isShellUrl(url) {
+    if (url.origin !== self.location.origin) return CDN_HOSTS.includes(url.hostname);
+    return AGENDA_PAGE.test(url.pathname) || url.pathname.startsWith(`${scopePath}assets/`) || url.pathname.startsWith(`${scopePath}static/`);
+}
+
+function clearCaches() {
+    return Promise.all([caches.delete(DATA_CACHE), caches.delete(SHELL_CACHE)]);
+}
+
+function isCacheable(response) {
+    // Respostas opacas (CDNs sem CORS) têm status 0; redirecionamentos costumam ser para o login
+    return response && !response.redirected && (response.ok || response.type === 'opaque');
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (isCacheable(response)) await cache.put(request, response.clone());
+    return response;
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    try {
+        const response = await fetch(request);
+        if (isCacheable(response)) await cache.put(request, response.clone());
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request, { ignoreSearch: true });
+        return cached || offlineResponse();
+    }
+}
+
+async function staleWhileRevalidate(event, cacheName, { notify = false } = {}) {
+    const request = event.request;
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(request);
+
+    const network = fetch(request).then(async response => {
+        if (!isCacheable(response)) return response;
+        await cache.put(request, response.clone());
+        if (cacheName === DATA_CACHE) await trimCache(cache, MAX_AGENDA_ENTRIES);
+        if (notify && cached && cached.headers.get('ETag') !== response.headers.get('ETag')) {
+            const clients = await self.clients.matchAll({ type: 'window' });
+            clients.forEach(client => client.postMessage({ type: 'agenda-updated', url: request.url }));
+        }
+        return response;
+    });
+
+    if (!cached) {
+        return network.catch(() => request.mode === 'navigate' ? offlineResponse() : Response.error());
+    }
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+}
+
+async function trimCache(cache, maxEntries) {
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(keys.length - maxEntries, 0)).map(key => cache.delete(key)));
+}
+
+function offlineResponse() {
+    const html = '<!doctype html><html lang="pt-BR"><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">'
+        + '<title>Sem conexão</title><body style="font-family:sans-serif;text-align:center;padding:3rem 1rem;color:#334155">'
+        + '<h1>Sem conexão</h1><p>Esta página não está salva neste aparelho. As agendas já abertas continuam disponíveis.</p>'
+        + `<p><a href="${scopePath}home">Voltar ao início</a></p></body></html>`;
+    return new Response(html, { status: 503, headers: { 'Content-Type': 'text/html; charset=utf-8' } });
+}
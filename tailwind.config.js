@@ -0,0 +1,16 @@
+/** Configuração usada por `flask build-assets` para gerar o CSS do Tailwind. */
+module.exports = {
+  // Somente as classes encontradas aqui entram no CSS final
+  content: ['./templates/**/*.html', './static/js/**/*.js'],
+  // Classes montadas dinamicamente (ex.: bg-{{ color }}-100 nos alertas) não aparecem literalmente nos templates
+  safelist: [
+    { pattern: /^(bg|border|text)-(blue|red|yellow|gray|green)-(100|500|700)$/ },
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [
+    require('@tailwindcss/forms'),
+    require('@tailwindcss/container-queries'),
+  ],
+};
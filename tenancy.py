@@ -0,0 +1,157 @@
+"""Várias escolas (tenants) numa mesma instalação.
+
+A escola da requisição vem do caminho (/s/<slug>/...), do hostname ou, na falta
+dos dois, da escola padrão (DEFAULT_SCHOOL_SLUG). Com uma escola ativa, toda
+consulta do ORM às tabelas com TenantMixin é filtrada por school_id e todo objeto
+novo recebe o school_id dela, aqui num só lugar. Escolas com database_url próprio
+têm seus dados lidos e gravados nesse banco; o cadastro de escolas fica sempre no
+banco principal.
+"""
+import time
+from contextlib import contextmanager
+from flask import abort, current_app, g, has_app_context, request
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import with_loader_criteria
+from models import db, School, TenantMixin
+from read_replica import RoutingSession
+
+SCHOOL_PATH_PREFIX = '/s/'
+SCHOOL_SLUG_ENVIRON_KEY = 'agenda.school_slug'
+
+# Cadastro das escolas em cache por processo: {(campo, valor): (expira_em, escola)}
+_school_cache = {}
+# Um engine (com seu pool) por banco de escola, criado no primeiro uso
+_tenant_engines = {}
+
+
+class SchoolPathMiddleware:
+    """Move o prefixo /s/<slug> do PATH_INFO para o SCRIPT_NAME.
+
+    Assim as rotas não mudam e o url_for já gera os links com o prefixo da escola.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(SCHOOL_PATH_PREFIX):
+            slug, _, rest = path[len(SCHOOL_PATH_PREFIX):].partition('/')
+            if slug:
+                environ[SCHOOL_SLUG_ENVIRON_KEY] = slug
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + SCHOOL_PATH_PREFIX + slug
+                environ['PATH_INFO'] = '/' + rest
+        return self.wsgi_app(environ, start_response)
+
+
+def init_app(app):
+    app.wsgi_app = SchoolPathMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def activate_request_school():
+        # Os arquivos estáticos são iguais para todas as escolas
+        if request.endpoint in ('static', 'serve_asset'):
+            return
+        school = resolve_request_school()
+        if school is None:
+            abort(404)
+        activate_school(school)
+
+    @app.context_processor
+    def inject_current_school():
+        return {'current_school': g.get('school')}
+
+
+def school_as_dict(school):
+    return {
+        'id': school.id,
+        'slug': school.slug,
+        'name': school.name,
+        'hostname': school.hostname,
+        'database_url': school.database_url,
+    }
+
+
+def find_school(field, value):
+    """Busca a escola por 'id', 'slug' ou 'hostname', com cache de SCHOOL_CACHE_SECONDS."""
+    key = (field, value)
+    now = time.monotonic()
+    cached = _school_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    school = db.session.execute(select(School).where(getattr(School, field) == value)).scalar_one_or_none()
+    school = school_as_dict(school) if school else None
+    _school_cache[key] = (now + current_app.config['SCHOOL_CACHE_SECONDS'], school)
+    return school
+
+
+def clear_school_cache():
+    _school_cache.clear()
+
+
+def resolve_request_school():
+    slug = request.environ.get(SCHOOL_SLUG_ENVIRON_KEY)
+    if slug:
+        # Um slug inexistente no caminho não cai na escola padrão
+        return find_school('slug', slug)
+    hostname = request.host.split(':')[0].lower()
+    return find_school('hostname', hostname) or find_school('slug', current_app.config['DEFAULT_SCHOOL_SLUG'])
+
+
+def tenant_engine(database_url):
+    engine = _tenant_engines.get(database_url)
+    if engine is None:
+        engine = _tenant_engines.setdefault(database_url, create_engine(database_url, pool_pre_ping=True))
+    return engine
+
+
+def activate_school(school):
+    g.school = school
+    g.school_id = school['id']
+    g.tenant_engine = tenant_engine(school['database_url']) if school['database_url'] else None
+
+
+def current_school_id():
+    return g.get('school_id') if has_app_context() else None
+
+
+@contextmanager
+def school_context(school_id):
+    """Ativa a escola fora de uma requisição (tarefas do Celery e comandos CLI)."""
+    school = find_school('id', school_id)
+    if school is None:
+        raise LookupError(f'Escola {school_id} não encontrada.')
+    previous = {name: g.get(name) for name in ('school', 'school_id', 'tenant_engine')}
+    activate_school(school)
+    try:
+        yield school
+    finally:
+        # Objetos desta escola (ids podem coincidir entre bancos) não ficam na sessão
+        db.session.remove()
+        for name, value in previous.items():
+            setattr(g, name, value)
+
+
+def all_school_ids():
+    return db.session.execute(select(School.id).order_by(School.id)).scalars().all()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def scope_to_current_school(state):
+    """Filtro central: SELECT, UPDATE e DELETE do ORM só enxergam a escola ativa."""
+    school_id = current_school_id()
+    if school_id is None or state.is_column_load:
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        state.statement = state.statement.options(with_loader_criteria(
+            TenantMixin, lambda cls: cls.school_id == school_id, include_aliases=True))
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def assign_current_school(session_, flush_context, instances):
+    for obj in session_.new:
+        if isinstance(obj, TenantMixin) and obj.school_id is None:
+            school_id = current_school_id()
+            if school_id is None:
+                raise RuntimeError(f'Nenhuma escola ativa para gravar {type(obj).__name__}.')
+            obj.school_id = school_id
@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+# O app lê DATABASE_URL ao ser importado
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+
+import pytest
+
+import app as app_module
+import tenancy
+from app import app as flask_app, celery, db
+from models import School, Teacher, Resource, ScheduleTemplate
+
+SLOTS = [{'name': '1ª aula', 'type': 'aula'}, {'name': 'Intervalo', 'type': 'intervalo'}, {'name': '2ª aula', 'type': 'aula'}]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    flask_app.config['TESTING'] = True
+    celery.conf.CELERY_ALWAYS_EAGER = True
+    monkeypatch.setattr(app_module, 'BACKUP_FOLDER', str(tmp_path / 'backups'))
+    os.makedirs(app_module.BACKUP_FOLDER)
+    app_module._occupancy_cache.clear()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(School(id=1, slug='default', name='Escola Padrão'))
+        db.session.commit()
+        tenancy.clear_school_cache()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def seed_school(school_id, resource_name='Laboratório'):
+    """Cria admin (matrícula 1), professor (matrícula 2) e um recurso com grade no turno matutino."""
+    with tenancy.school_context(school_id):
+        admin = Teacher(name='Administrador', registration='1', is_admin=True)
+        teacher = Teacher(name='Ana Souza', registration='2')
+        resource = Resource(name=resource_name)
+        db.session.add_all([admin, teacher, resource])
+        db.session.commit()
+        db.session.add(ScheduleTemplate(resource_id=resource.id, shift='matutino', slots=SLOTS))
+        db.session.commit()
+        return {'admin': admin.id, 'teacher': teacher.id, 'resource': resource.id}
+
+
+@pytest.fixture
+def school(app):
+    with app.app_context():
+        return seed_school(1)
+
+
+@pytest.fixture
+def other_school(app):
+    """Segunda escola no mesmo banco, acessada pelo caminho /s/outra."""
+    with app.app_context():
+        db.session.add(School(id=2, slug='outra', name='Outra Escola'))
+        db.session.commit()
+        tenancy.clear_school_cache()
+        return seed_school(2, 'Quadra')
+
+
+def login(app, registration, prefix=''):
+    client = app.test_client()
+    client.post(f'{prefix}/login', data={'registration': registration})
+    return client
+
+
+@pytest.fixture
+def admin_client(app, school):
+    return login(app, '1')
+
+
+@pytest.fixture
+def teacher_client(app, school):
+    return login(app, '2')
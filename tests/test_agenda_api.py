@@ -0,0 +1,70 @@
+from datetime import date
+
+import tenancy
+from app import db
+from models import Booking, Teacher
+from conftest import login
+
+TODAY = date.today().isoformat()
+
+
+def slot_request(resource_id, slot_name='1ª aula', **extra):
+    return {'resource_id': resource_id, 'date': TODAY, 'shift': 'matutino', 'slot_name': slot_name, **extra}
+
+
+def test_book(school, teacher_client, admin_client):
+    response = teacher_client.post('/api/agenda/book', json=slot_request(school['resource']))
+    assert response.status_code == 201
+    slot = response.get_json()['slot']
+    assert slot['booked_by'] == 'Ana Souza' and slot['is_mine'] is True and slot['booking_id']
+
+    # Admin agendando para um professor
+    response = admin_client.post('/api/agenda/book', json=slot_request(school['resource'], '2ª aula', teacher_id=school['teacher']))
+    assert response.status_code == 201
+    assert response.get_json()['slot']['booked_by'] == 'Ana Souza'
+
+
+def test_book_errors(school, teacher_client, admin_client):
+    assert teacher_client.post('/api/agenda/book', json=slot_request(school['resource'], 'Intervalo')).status_code == 400
+    assert teacher_client.post('/api/agenda/book', json=slot_request(school['resource'], '9ª aula')).status_code == 400
+    assert teacher_client.post('/api/agenda/book', json={'resource_id': 'x'}).status_code == 400
+    assert teacher_client.post('/api/agenda/book', json=slot_request(9999)).status_code == 400
+    assert admin_client.post('/api/agenda/book', json=slot_request(school['resource'], teacher_id=9999)).status_code == 404
+
+    assert teacher_client.post('/api/agenda/book', json=slot_request(school['resource'])).status_code == 201
+    taken = admin_client.post('/api/agenda/book', json=slot_request(school['resource']))
+    assert taken.status_code == 409
+    assert taken.get_json()['slot']['booked_by'] == 'Ana Souza'
+
+
+def test_close(school, teacher_client, admin_client):
+    assert teacher_client.post('/api/agenda/close', json=slot_request(school['resource'])).status_code == 403
+
+    response = admin_client.post('/api/agenda/close', json=slot_request(school['resource']))
+    assert response.status_code == 201
+    assert response.get_json()['slot']['booked_by'] == 'Fechado'
+    assert admin_client.post('/api/agenda/close', json=slot_request(school['resource'])).status_code == 409
+    assert teacher_client.post('/api/agenda/book', json=slot_request(school['resource'])).status_code == 409
+
+
+def test_delete(app, school, teacher_client, admin_client):
+    booking_id = teacher_client.post('/api/agenda/book', json=slot_request(school['resource'])).get_json()['slot']['booking_id']
+    with app.app_context(), tenancy.school_context(1):
+        db.session.add(Teacher(name='Bruno Lima', registration='3'))
+        db.session.commit()
+    other_teacher = login(app, '3')
+
+    response = other_teacher.delete(f'/api/agenda/booking/{booking_id}')
+    assert response.status_code == 403
+
+    response = teacher_client.delete(f'/api/agenda/booking/{booking_id}')
+    assert response.status_code == 200
+    assert response.get_json()['slot'] == {
+        'name': '1ª aula', 'type': 'aula', 'booked_by': None, 'booking_id': None, 'is_mine': False, 'is_admin': False}
+    assert teacher_client.delete(f'/api/agenda/booking/{booking_id}').status_code == 404
+
+    # O admin remove o agendamento de qualquer professor
+    booking_id = teacher_client.post('/api/agenda/book', json=slot_request(school['resource'])).get_json()['slot']['booking_id']
+    assert admin_client.delete(f'/api/agenda/booking/{booking_id}').status_code == 200
+    with app.app_context(), tenancy.school_context(1):
+        assert db.session.query(Booking).count() == 0
@@ -0,0 +1,32 @@
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture
+def dist_dir(app, tmp_path, monkeypatch):
+    dist = tmp_path / 'dist'
+    dist.mkdir()
+    (dist / 'app.0123abcd.js').write_text('console.log(1);')
+    (dist / 'app.0123abcd.js.gz').write_bytes(gzip.compress(b'console.log(1);'))
+    (dist / 'manifest.json').write_text(json.dumps({'app.js': 'app.0123abcd.js'}))
+    monkeypatch.setitem(app.config, 'ASSETS_DIST_DIR', str(dist))
+    return dist
+
+
+def test_hashed_bundle_is_immutable(app, dist_dir):
+    response = app.test_client().get('/assets/app.0123abcd.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype in ('text/javascript', 'application/javascript')
+    assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_manifest_is_revalidated(app, dist_dir):
+    response = app.test_client().get('/assets/manifest.json')
+    assert response.status_code == 200
+    assert response.cache_control.no_cache
+    assert not response.cache_control.immutable
+    assert response.cache_control.max_age == 0
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+
+import tenancy
+from app import db, compact_booking_changes
+from models import BOOKING_CHANGE_LOCK_ID, BookingChange, lock_booking_changes
+
+
+def book(client, resource_id, slot_name):
+    return client.post('/api/agenda/book', json={
+        'resource_id': resource_id, 'date': date.today().isoformat(), 'shift': 'matutino', 'slot_name': slot_name})
+
+
+def changes(client, since):
+    response = client.get('/api/changes', query_string={'since': since})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_changes_since_sequence(app, school, teacher_client):
+    book(teacher_client, school['resource'], '1ª aula')
+    first = changes(teacher_client, 0)
+    assert [change['slot_name'] for change in first['changes']] == ['1ª aula']
+    assert first['changes'][0]['is_mine'] is True
+
+    booking_id = book(teacher_client, school['resource'], '2ª aula').get_json()['slot']['booking_id']
+    teacher_client.delete(f'/api/agenda/booking/{booking_id}')
+    delta = changes(teacher_client, first['latest'])
+    assert [(change['op'], change['slot_name']) for change in delta['changes']] == [('insert', '2ª aula'), ('delete', '2ª aula')]
+    assert delta['reset'] is False
+    assert changes(teacher_client, delta['latest'])['changes'] == []
+
+
+def test_reset_after_compaction(app, school, teacher_client):
+    book(teacher_client, school['resource'], '1ª aula')
+    book(teacher_client, school['resource'], '2ª aula')
+    with app.app_context(), tenancy.school_context(1):
+        BookingChange.query.update({BookingChange.changed_at: datetime.utcnow() - timedelta(days=30)})
+        db.session.commit()
+        assert compact_booking_changes() == 1 # A entrada mais recente fica
+        latest_seq = db.session.query(db.func.max(BookingChange.seq)).scalar()
+
+    # Quem parou antes do ponto compactado recarrega tudo
+    stale = changes(teacher_client, 0)
+    assert stale['reset'] is True and stale['latest'] == latest_seq
+    # Quem está em dia continua recebendo só o delta
+    assert changes(teacher_client, latest_seq - 1)['reset'] is False
+    # À frente do log (ex.: banco restaurado de um backup antigo)
+    assert changes(teacher_client, latest_seq + 10)['reset'] is True
+
+
+def test_lock_is_per_school():
+    executed = []
+
+    class Connection:
+        class dialect:
+            name = 'postgresql'
+
+        def execute(self, statement, params):
+            executed.append((str(statement), params))
+
+    lock_booking_changes(Connection(), 7)
+    assert executed == [('SELECT pg_advisory_xact_lock(:key, :school_id)', {'key': BOOKING_CHANGE_LOCK_ID, 'school_id': 7})]
@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+
+import tenancy
+from app import app as flask_app, calendar_serializer, db
+from models import Booking, Teacher
+
+
+def add_bookings(app, school, *days_shifts, teacher='teacher'):
+    """Cria agendamentos (dias a partir de hoje, turno) direto no banco e retorna os ids."""
+    with app.app_context(), tenancy.school_context(1):
+        owner = db.session.get(Teacher, school[teacher])
+        bookings = [Booking(resource_id=school['resource'], teacher_id=owner.id, teacher_name=owner.name,
+                            date=date.today() + timedelta(days=days), shift=shift, slot_name='1ª aula')
+                    for days, shift in days_shifts]
+        db.session.add_all(bookings)
+        db.session.commit()
+        return [booking.id for booking in bookings]
+
+
+def all_pages(client, limit):
+    ids, pages, cursor = [], 0, None
+    while True:
+        params = {'limit': limit, **({'after': cursor} if cursor else {})}
+        page = client.get('/api/my-bookings', query_string=params).get_json()
+        ids += [booking['id'] for booking in page['bookings']]
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids, pages
+
+
+def test_keyset_pages_follow_date_shift_id(app, school, teacher_client):
+    ids = add_bookings(app, school, (2, 'vespertino'), (1, 'vespertino'), (1, 'matutino'), (0, 'matutino'), (1, 'matutino'))
+    add_bookings(app, school, (-1, 'matutino')) # Passado: fora da lista
+    add_bookings(app, school, (1, 'matutino'), teacher='admin') # De outro professor
+    expected = [ids[3], ids[2], ids[4], ids[1], ids[0]]
+
+    for limit in (1, 2, 4, 5, 100):
+        assert all_pages(teacher_client, limit)[0] == expected
+    # Sem página final vazia quando o total é múltiplo do limite
+    assert all_pages(teacher_client, 5)[1] == 1
+    assert all_pages(teacher_client, 1)[1] == 5
+
+
+def test_invalid_pagination(app, school, teacher_client):
+    assert teacher_client.get('/api/my-bookings?after=nao-e-um-cursor').status_code == 400
+    assert teacher_client.get('/api/my-bookings?limit=abc').status_code == 400
+    add_bookings(app, school, (0, 'matutino'), (1, 'matutino'))
+    # O limite fica entre 1 e 100
+    assert len(teacher_client.get('/api/my-bookings?limit=0').get_json()['bookings']) == 1
+
+
+def feed_url(school_id, teacher_id):
+    with flask_app.test_request_context():
+        return f'/calendar/{calendar_serializer.dumps([school_id, teacher_id])}.ics'
+
+
+def test_calendar_feed_etag(app, school, teacher_client):
+    add_bookings(app, school, (0, 'matutino'))
+    client = app.test_client() # O feed é assinado, não usa a sessão
+    url = feed_url(1, school['teacher'])
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    body = response.get_data(as_text=True)
+    assert body.count('BEGIN:VEVENT') == 1 and 'Laboratório - 1ª aula' in body
+    etag = response.headers['ETag']
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # Um agendamento novo muda o ETag
+    teacher_client.post('/api/agenda/book', json={
+        'resource_id': school['resource'], 'date': date.today().isoformat(), 'shift': 'matutino', 'slot_name': '2ª aula'})
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('BEGIN:VEVENT') == 2
+
+
+def test_calendar_feed_rejects_other_tokens(app, school, other_school):
+    client = app.test_client()
+    assert client.get('/calendar/token-invalido.ics').status_code == 404
+    # Token de um professor da escola 1 aberto pelo caminho da escola 2
+    assert client.get('/s/outra' + feed_url(1, school['teacher'])).status_code == 404
@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import app as app_module
+import tenancy
+from app import db, occupancy_summary, purge_resource_task
+from models import Booking
+
+
+def occupancy_day():
+    day = date.today()
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def book(client, resource_id, day, slot_name='1ª aula'):
+    return client.post('/api/agenda/book', json={
+        'resource_id': resource_id, 'date': day.isoformat(), 'shift': 'matutino', 'slot_name': slot_name})
+
+
+def summary(app):
+    with app.app_context(), tenancy.school_context(1):
+        return occupancy_summary()[1]
+
+
+def test_counts_today_and_week(app, school, admin_client, teacher_client):
+    day = occupancy_day()
+    assert book(teacher_client, school['resource'], day).status_code == 201
+    assert admin_client.post('/api/agenda/close', json={
+        'resource_id': school['resource'], 'date': day.isoformat(), 'shift': 'matutino', 'slot_name': '2ª aula'}).status_code == 201
+
+    counts = summary(app)[school['resource']]
+    # O intervalo não conta como horário agendável
+    assert counts['today']['matutino'] == {'total': 2, 'booked': 1, 'closed': 1, 'free': 0}
+    week_days = 5 - day.weekday()
+    assert counts['week']['matutino'] == {'total': 2 * week_days, 'booked': 1, 'closed': 1, 'free': 2 * week_days - 2}
+
+
+def test_write_invalidates_cache_of_every_process(app, school, teacher_client):
+    day = occupancy_day()
+    assert summary(app)[school['resource']]['today']['matutino']['booked'] == 0
+    cached = dict(app_module._occupancy_cache)
+
+    book(teacher_client, school['resource'], day)
+    # Outro processo ainda teria o resumo antigo no seu cache: a versão gravada no banco o invalida
+    app_module._occupancy_cache.clear()
+    app_module._occupancy_cache.update(cached)
+    assert summary(app)[school['resource']]['today']['matutino']['booked'] == 1
+
+
+def test_purge_task_invalidates_cache(app, school, teacher_client):
+    day = occupancy_day()
+    book(teacher_client, school['resource'], day)
+    assert summary(app)[school['resource']]['today']['matutino']['booked'] == 1
+
+    with app.app_context():
+        purge_resource_task.apply(args=[1, school['resource']])
+        with tenancy.school_context(1):
+            assert db.session.query(Booking).count() == 0
+    assert school['resource'] not in summary(app)
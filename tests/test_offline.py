@@ -0,0 +1,34 @@
+from datetime import date
+
+import tenancy
+from app import db
+from models import Booking
+
+
+def book(client, resource_id, slot_name='1ª aula'):
+    return client.post('/api/agenda/book', json={
+        'resource_id': resource_id, 'date': date.today().isoformat(), 'shift': 'matutino', 'slot_name': slot_name})
+
+
+def test_replayed_book_returns_slot_state(app, school, teacher_client, admin_client):
+    first = book(teacher_client, school['resource'])
+    assert first.status_code == 201
+    booking_id = first.get_json()['slot']['booking_id']
+
+    # A fila offline reenvia uma ação que já tinha chegado ao servidor: o 409 traz o
+    # horário com quem o agendou, e offline.js reconhece a ação como já aplicada
+    replay = book(teacher_client, school['resource'])
+    assert replay.status_code == 409
+    slot = replay.get_json()['slot']
+    assert slot['booked_by'] == 'Ana Souza'
+    assert slot['booking_id'] == booking_id
+    assert slot['is_mine'] is True
+
+    # Para outro usuário é um conflito de verdade
+    conflict = book(admin_client, school['resource'])
+    assert conflict.status_code == 409
+    assert conflict.get_json()['slot']['booked_by'] == 'Ana Souza'
+    assert conflict.get_json()['slot']['is_mine'] is False
+    with app.app_context(), tenancy.school_context(1):
+        assert db.session.query(Booking).count() == 1
+
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pytest
+from sqlalchemy import create_engine
+
+import read_replica
+from app import db
+
+
+@pytest.fixture
+def use_replica(app, monkeypatch):
+    """Configura a réplica com a URL informada e devolve o estado dela (por processo)."""
+    status = {'checked_at': float('-inf'), 'healthy': False}
+    monkeypatch.setattr(read_replica, '_replica_status', status)
+    engines = []
+
+    def configure(url):
+        engine = create_engine(url)
+        engines.append(engine)
+        monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', {read_replica.REPLICA_BIND: url})
+        with app.app_context():
+            db.engines[read_replica.REPLICA_BIND] = engine
+        return status
+
+    yield configure
+    with app.app_context():
+        db.engines.pop(read_replica.REPLICA_BIND, None)
+    for engine in engines:
+        engine.dispose()
+
+
+def copy_primary(tmp_path):
+    replica_path = tmp_path / 'replica.db'
+    primary_path = os.environ['DATABASE_URL'].split('///')[1]
+    with closing(sqlite3.connect(primary_path)) as source, closing(sqlite3.connect(replica_path)) as target:
+        source.backup(target)
+    return f'sqlite:///{replica_path}'
+
+
+def test_reads_from_healthy_replica(use_replica, admin_client, tmp_path):
+    status = use_replica(copy_primary(tmp_path))
+    response = admin_client.get('/admin/weekly-view')
+    assert response.status_code == 200
+    assert response.headers['X-DB-Route'] == 'replica'
+    assert status['healthy'] is True
+    # Rotas sem @read_only continuam no primário
+    assert 'X-DB-Route' not in admin_client.get('/admin/teachers').headers
+
+
+def test_falls_back_when_replica_is_down(use_replica, admin_client, tmp_path):
+    status = use_replica(f"sqlite:///{tmp_path / 'nao-existe' / 'replica.db'}")
+    response = admin_client.get('/admin/weekly-view')
+    assert response.status_code == 200
+    assert 'X-DB-Route' not in response.headers
+    assert status['healthy'] is False
+    assert status['checked_at'] > float('-inf')
+
+
+def test_retries_on_primary_when_replica_fails_mid_request(use_replica, admin_client, tmp_path):
+    # Responde ao SELECT 1 da verificação, mas não tem as tabelas
+    status = use_replica(f"sqlite:///{tmp_path / 'vazia.db'}")
+    response = admin_client.get('/admin/weekly-view')
+    assert response.status_code == 200
+    assert 'X-DB-Route' not in response.headers
+    assert status['healthy'] is False # Só é tentada de novo depois de REPLICA_RETRY_AFTER
+
+
+def test_reads_own_writes_from_primary(use_replica, admin_client, school, tmp_path):
+    use_replica(copy_primary(tmp_path))
+    admin_client.post('/api/agenda/close', json={
+        'resource_id': school['resource'], 'date': time.strftime('%Y-%m-%d'), 'shift': 'matutino', 'slot_name': '1ª aula'})
+    assert 'X-DB-Route' not in admin_client.get('/admin/weekly-view').headers
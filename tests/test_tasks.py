@@ -0,0 +1,81 @@
+from datetime import date
+
+from kombu.exceptions import OperationalError
+
+import app as app_module
+import tenancy
+from app import db, purge_resource_task
+from models import BackgroundTask, Booking, Resource, Teacher
+from conftest import login
+
+
+def book(client, resource_id, slot_name='1ª aula'):
+    return client.post('/api/agenda/book', json={
+        'resource_id': resource_id, 'date': date.today().isoformat(), 'shift': 'matutino', 'slot_name': slot_name})
+
+
+def task_id_from(response):
+    return response.headers['Location'].split('task=')[1]
+
+
+def test_delete_resource_hides_then_purges(app, school, admin_client, teacher_client, monkeypatch):
+    assert book(teacher_client, school['resource']).status_code == 201
+    purged = []
+    # Roda a remoção só depois de conferir o estado intermediário
+    monkeypatch.setattr(purge_resource_task, 'delay', lambda *args: purged.append(args) or purge_resource_task.AsyncResult('tarefa-1'))
+
+    response = admin_client.get(f"/admin/resource/delete/{school['resource']}")
+    assert task_id_from(response) == 'tarefa-1'
+    with app.app_context(), tenancy.school_context(1):
+        resource = db.session.get(Resource, school['resource'])
+        assert resource.deleted_at is not None
+        assert Resource.active().count() == 0
+        assert Booking.query.count() == 1 # Ainda não apagado
+        assert BackgroundTask.query.filter_by(task_id='tarefa-1').one().name == purge_resource_task.name
+
+    assert purged == [(1, school['resource'])]
+    with app.app_context():
+        assert purge_resource_task.apply(args=purged[0]).result == {'deleted': 1, 'total': 1}
+        with tenancy.school_context(1):
+            assert db.session.get(Resource, school['resource']) is None
+            assert Booking.query.count() == 0
+
+
+def test_delete_teacher_purges_in_worker(app, school, admin_client, teacher_client):
+    assert book(teacher_client, school['resource']).status_code == 201
+    response = admin_client.get(f"/admin/teacher/delete/{school['teacher']}")
+    assert task_id_from(response)
+    with app.app_context(), tenancy.school_context(1):
+        assert db.session.get(Teacher, school['teacher']) is None
+        assert Booking.query.count() == 0
+
+
+def test_delete_with_queue_down_fails_fast(app, school, admin_client, monkeypatch):
+    def broker_down(*args):
+        raise OperationalError('Error 111 connecting to localhost:6379. Connection refused.')
+
+    monkeypatch.setattr(purge_resource_task, 'delay', broker_down)
+    response = admin_client.get(f"/admin/resource/delete/{school['resource']}")
+    assert response.status_code == 302 and 'task=' not in response.headers['Location']
+    with app.app_context(), tenancy.school_context(1):
+        # Fica oculto; `flask purge-deleted` conclui depois
+        assert Resource.active().count() == 0
+        assert db.session.get(Resource, school['resource']) is not None
+
+
+def test_task_status_only_for_own_school(app, school, other_school, admin_client, monkeypatch):
+    monkeypatch.setattr(purge_resource_task, 'delay', lambda *args: purge_resource_task.AsyncResult('tarefa-1'))
+    admin_client.get(f"/admin/resource/delete/{school['resource']}")
+
+    class Result:
+        state = 'PROGRESS'
+        info = {'deleted': 500, 'total': 1200}
+
+    monkeypatch.setattr(app_module.celery, 'AsyncResult', lambda task_id: Result())
+    response = admin_client.get('/admin/tasks/tarefa-1')
+    assert response.status_code == 200
+    assert response.get_json() == {'state': 'PROGRESS', 'progress': {'deleted': 500, 'total': 1200}}
+
+    other_admin = login(app, '1', prefix='/s/outra')
+    assert other_admin.get('/s/outra/admin/tasks/tarefa-1').status_code == 404
+    assert admin_client.get('/admin/tasks/desconhecida').status_code == 404
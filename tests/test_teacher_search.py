@@ -0,0 +1,47 @@
+import tenancy
+from app import db
+from models import Teacher, TeacherSearchTerm
+
+
+def add_teachers(app, *teachers):
+    with app.app_context(), tenancy.school_context(1):
+        db.session.add_all(Teacher(name=name, registration=registration) for name, registration in teachers)
+        db.session.commit()
+
+
+def search(client, q, **params):
+    response = client.get('/api/teachers/search', query_string={'q': q, **params})
+    assert response.status_code == 200
+    return [teacher['name'] for teacher in response.get_json()]
+
+
+def test_prefix_of_any_word_ignoring_accents(app, admin_client):
+    add_teachers(app, ('José Álvares', '300'), ('Maria José Lima', '301'), ('Joana Prado', '302'))
+    assert search(admin_client, 'jose') == ['José Álvares', 'Maria José Lima']
+    assert search(admin_client, 'ALVA') == ['José Álvares']
+    assert search(admin_client, 'jo', limit=1) == ['Joana Prado']
+    assert search(admin_client, '%') == []
+
+
+def test_ranking(app, admin_client):
+    add_teachers(app, ('Carla Rocha', 'AB10'), ('Abner Dias', '500'), ('Paulo Abreu', '501'), ('Bruno Costa', 'ab'))
+    # Matrícula exata (sem diferenciar maiúsculas), início do nome, início da matrícula, outra palavra do nome
+    assert search(admin_client, 'AB') == ['Bruno Costa', 'Abner Dias', 'Carla Rocha', 'Paulo Abreu']
+
+
+def test_terms_follow_edits_and_hidden_teachers(app, school, admin_client):
+    assert search(admin_client, 'souza') == ['Ana Souza']
+    with app.app_context(), tenancy.school_context(1):
+        teacher = db.session.get(Teacher, school['teacher'])
+        teacher.name = 'Ana Pereira'
+        db.session.commit()
+        assert db.session.query(TeacherSearchTerm).filter_by(teacher_id=teacher.id, position=0).one().term == 'ana pereira'
+    assert search(admin_client, 'souza') == []
+    assert search(admin_client, 'pere') == ['Ana Pereira']
+
+    admin_client.get(f"/admin/teacher/delete/{school['teacher']}")
+    assert search(admin_client, 'pere') == []
+
+
+def test_search_is_admin_only(teacher_client):
+    assert teacher_client.get('/api/teachers/search?q=a').status_code == 403
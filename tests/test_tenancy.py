@@ -0,0 +1,62 @@
+import sqlite3
+from datetime import date
+
+from alembic.script import ScriptDirectory
+
+import tenancy
+from app import db
+from models import Booking, School
+from conftest import login
+
+TODAY = date.today().isoformat()
+
+
+def book(client, resource_id, prefix=''):
+    return client.post(f'{prefix}/api/agenda/book', json={
+        'resource_id': resource_id, 'date': TODAY, 'shift': 'matutino', 'slot_name': '1ª aula'})
+
+
+def test_reads_are_isolated(app, school, other_school, teacher_client):
+    other_teacher = login(app, '2', prefix='/s/outra')
+    assert book(teacher_client, school['resource']).status_code == 201
+    assert book(other_teacher, other_school['resource'], prefix='/s/outra').status_code == 201
+
+    # A grade e os agendamentos do recurso de outra escola não aparecem
+    assert teacher_client.get(f"/api/agenda/{other_school['resource']}/{TODAY}").get_json() == {}
+    assert [booking['resource_name'] for booking in teacher_client.get('/api/my-bookings').get_json()['bookings']] == ['Laboratório']
+    assert [booking['resource_name'] for booking in other_teacher.get('/s/outra/api/my-bookings').get_json()['bookings']] == ['Quadra']
+    assert [change['resource_id'] for change in other_teacher.get('/s/outra/api/changes?since=0').get_json()['changes']] \
+        == [other_school['resource']]
+
+    # Mesma matrícula nas duas escolas: a sessão de uma não vale na outra
+    assert teacher_client.get('/s/outra/api/my-bookings').status_code == 302
+
+
+def test_deletes_are_isolated(app, school, other_school, admin_client):
+    booking_id = book(admin_client, school['resource']).get_json()['slot']['booking_id']
+    other_admin = login(app, '1', prefix='/s/outra')
+    assert other_admin.delete(f'/s/outra/api/agenda/booking/{booking_id}').status_code == 404
+    other_admin.get(f"/s/outra/admin/resource/delete/{school['resource']}")
+    with app.app_context(), tenancy.school_context(1):
+        assert db.session.get(Booking, booking_id) is not None
+        assert db.session.query(Booking).count() == 1
+
+
+def test_upgrade_db_migrates_school_databases(app, tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'escola.db'}"
+    with app.app_context():
+        db.session.add(School(id=3, slug='propria', name='Escola com Banco Próprio', database_url=database_url))
+        db.session.commit()
+    runner = app.test_cli_runner()
+    # Um banco que parou numa revisão anterior
+    assert runner.invoke(args=['db', '-x', f'database_url={database_url}', 'upgrade', 'b3240784f079']).exit_code == 0
+
+    with app.app_context():
+        head = ScriptDirectory.from_config(app.extensions['migrate'].migrate.get_config()).get_current_head()
+
+    result = runner.invoke(args=['schools', 'upgrade-db'])
+    assert result.exit_code == 0, result.output
+    assert 'Escola propria: banco atualizado.' in result.output
+    with sqlite3.connect(tmp_path / 'escola.db') as connection:
+        assert connection.execute('SELECT version_num FROM alembic_version').fetchall() == [(head,)]
+        assert 'position' in [column[1] for column in connection.execute('PRAGMA table_info(teacher_search_term)')]